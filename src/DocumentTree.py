@@ -1,10 +1,13 @@
 import re
 import json
+import hashlib
 from parser_agent import extract_format
 from merge_format_agent import merge_format
 # from refine_format_agent import refine_format
 import os
-from utils import askLLM
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from utils import askLLM, artifact_store, LLM_CONCURRENCY, SUMMARY_BATCH_TOKENS, SUMMARY_BATCH_MAX_SECTIONS
+from retry import RetryError
 
 def contains_table(section_content):
     pattern = r'(?:\s*\+-+[\+-]*\n)+'  # Horizontal dividers (+---+)
@@ -15,13 +18,82 @@ def contains_table(section_content):
         return False
     return True
 
+def initial_format(title, content):
+    # Sections without a table keep their title as format, the others wait for extraction
+    return None if contains_table(content) else title
+
+def section_hash(title, content):
+    return hashlib.sha256((title + "\n" + content).encode("utf-8")).hexdigest()
+
 def summary_section(section):
     prompt = f"""
     Task: Answer in this format: this secition decribes [one sentence].
     {section[1]}: 
     {section[2]}
     """
-    return askLLM(prompt)
+    return askLLM(prompt, stage="summary")
+
+def estimate_tokens(text):
+    # Rough count, about 4 characters per token for English prose
+    return len(text) // 4 + 1
+
+def batch_sections(sections, token_budget=SUMMARY_BATCH_TOKENS, max_sections=SUMMARY_BATCH_MAX_SECTIONS):
+    batches = []
+    current = []
+    size = 0
+    for section in sections:
+        tokens = estimate_tokens(section[1] + section[2])
+        # Section numbers are the keys of the batched answer, so they must be unique within a batch
+        if current and (size + tokens > token_budget or len(current) >= max_sections or section[0] in [s[0] for s in current]):
+            batches.append(current)
+            current = []
+            size = 0
+        current.append(section)
+        size += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_batch_summaries(answer, numbers):
+    match = re.search(r'\{.*\}', answer, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {number: data[number] for number in numbers if isinstance(data.get(number), str) and data[number].strip()}
+
+def summary_section_batch(sections):
+    if len(sections) == 1:
+        return [summary_section(sections[0])]
+    body = ""
+    for section in sections:
+        body += f"Section {section[0]} {section[1]}:\n{section[2]}\n\n"
+    prompt = f"""
+    Task: For each section below, answer in this format: this secition decribes [one sentence].
+    Return only a JSON object mapping every section number to its answer, e.g. {{"{sections[0][0]}": "this secition decribes ..."}}.
+
+    {body}
+    """
+    answers = parse_batch_summaries(askLLM(prompt, stage="summary"), [section[0] for section in sections])
+    if len(answers) < len(sections):
+        print(f"Malformed batch summary, falling back to single calls for {len(sections) - len(answers)} section(s)")
+    return [answers[section[0]] if section[0] in answers else summary_section(section) for section in sections]
+
+def summary_all_sections(sections, max_workers=LLM_CONCURRENCY, batch_tokens=SUMMARY_BATCH_TOKENS):
+    # Sections are independent, pack them into batches and dispatch all batches at once, keeping the section order
+    non_empty = [section for section in sections if section[2] != ""]
+    if batch_tokens > 0:
+        batches = batch_sections(non_empty, batch_tokens)
+    else:
+        batches = [[section] for section in non_empty]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(summary_section_batch, batches))
+    summaries = iter([summary for batch in results for summary in batch])
+    return [next(summaries) if section[2] != "" else None for section in sections]
 
 def summary_subsections(sectionname, summaries):
     prompt = f"""
@@ -29,23 +101,7 @@ def summary_subsections(sectionname, summaries):
     {sectionname}:
     {summaries}
     """
-    return askLLM(prompt)
-
-def get_most_recent_format():
-    directory = "./everparse/everparse_files"
-    # List all subdirectories in the given directory
-    subfolders = [os.path.join(directory, d) for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d))]
-    
-    # Sort the subdirectories based on modification time in descending order
-    subfolders.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-    
-    # Return the most recently modified subfolder
-    if subfolders:
-        subfolder_name = os.path.basename(subfolders[0])
-        file_path = os.path.join(subfolders[0], subfolder_name + '.3d')
-        return file_path
-    else:
-        return None
+    return askLLM(prompt, stage="summary")
 
 def hierachy(sections):
     prompt = f"""
@@ -65,25 +121,29 @@ def hierachy(sections):
     Please provide your analysis following these instructions and formatting rules.
 
     """
-    return askLLM(prompt)
+    return askLLM(prompt, stage="hierarchy")
 
-def extract_format_from_section(section):
+def extract_format_from_section(section, protocol):
     number, title, content = section
     print(f"{number} {title}:\n")
     if contains_table(content) or "format" in content:
-        extract_format(title+":\n"+content)
-        return get_most_recent_format()
+        try:
+            path = extract_format(title+":\n"+content)
+        except RetryError as e:
+            print(f"Section {number}: {e}")
+            return None
+        if path:
+            artifact_store.record(protocol, number, "extract", path, section_hash(title, content))
+        return path
     else:
         return None
 
 def isdescendant(node1, node2):
-    if node1.number == node2.number:
-        return True
-    
-    for child in node1.children:
-        if isdescendant(child, node2):
+    # Walks up from node2, O(depth)
+    while node2:
+        if node1.number == node2.number:
             return True
-    
+        node2 = node2.parent
     return False
 
 def extract_struct_names(format_code):
@@ -100,25 +160,43 @@ class SectionNode:
         self.content = content
         self.summary = summary
         self.format = format
+        self.base_format = format # format of the section itself, before its children were merged into it
+        self.merged = False # children merged into format, reset when anything below changes
+        self.content_hash = section_hash(title, content)
+        self.error = None # last extraction/merge failure of this section, the pipeline keeps going without it
         self.children = []      
+        self.parent = None
+        self.index = {number: self} # number -> node of the whole tree, shared by all its nodes
+
+    def subtree(self):
+        yield self
+        for child in self.children:
+            yield from child.subtree()
 
     def add_child(self, child):
         if self.find_child(child.number):
             return
         self.children.append(child)
+        child.parent = self
+        if child.index is not self.index:
+            # A subtree joining the tree brings its nodes into the shared index
+            for node in child.subtree():
+                self.index[node.number] = node
+                node.index = self.index
 
     def remove_child(self, childnum):
+        # The detached node stays in the index, re-parenting adds it right back
         for child in self.children:
             if child.number == childnum:
                 self.children.remove(child)
+                child.parent = None
+                return
             
     def find_child(self, childnum):
-        if self.number == childnum:
-            return self
-        for child in self.children:
-            re = child.find_child(childnum)
-            if re:
-                return re
+        # O(1) lookup plus an O(depth) check that the node is in this subtree
+        node = self.index.get(childnum)
+        if node is not None and isdescendant(self, node):
+            return node
         return None
 
     def display(self, level=0):
@@ -137,86 +215,169 @@ class SectionNode:
             'content': self.content,
             'summary': self.summary,
             'format': self.format,
+            'base_format': self.base_format,
+            'merged': self.merged,
+            'content_hash': self.content_hash,
+            'error': self.error,
             'children': [child.to_dict() for child in self.children]
         }
 
     @staticmethod
     def from_dict(data, number_to_node):
         node = SectionNode(data['number'], data['title'], data['content'], data['summary'], data['format'])
-        node.children = [SectionNode.from_dict(child, number_to_node) for child in data['children']]
+        node.base_format = data.get('base_format', node.format)
+        node.merged = data.get('merged', False)
+        node.content_hash = data.get('content_hash', node.content_hash)
+        node.error = data.get('error')
+        # number_to_node becomes the index of the loaded tree
+        node.index = number_to_node
         number_to_node[data['number']] = node
+        for child in data['children']:
+            node.add_child(SectionNode.from_dict(child, number_to_node))
         return node
 
-    def generate_format(self):
+    def generate_format(self, protocol, checkpoint=None):
         # Recursively check each node's format and print if it's None
         if self.format is None:
-            print(f"Section {self.number} titled '{self.title}' has no format specified.")
-            extract_format(self.title+":\n"+self.content)
-            self.format = get_most_recent_format()
+            self.set_extracted_format(*self.extract_own_format(protocol), protocol)
+            if checkpoint:
+                checkpoint()
         for child in self.children:
-            child.generate_format()
+            child.generate_format(protocol, checkpoint)
+
+    def extract_own_format(self, protocol):
+        """Run the extraction agent on this section, returns (path, error). Leaves the node untouched."""
+        print(f"Section {self.number} titled '{self.title}' has no format specified.")
+        path = artifact_store.lookup(protocol, self.number, "extract", self.content_hash)
+        if path:
+            # Extracted from the same text before, e.g. by a run that crashed before saving the tree
+            print(f"Section {self.number}: reusing {path}.")
+            return path, None
+        try:
+            path = extract_format(self.title+":\n"+self.content)
+        except RetryError as e:
+            print(f"Section {self.number}: format extraction failed, skipping it.")
+            return None, f"extract: {e}"
+        return path, None if path else "extract: no verified format"
+
+    def set_extracted_format(self, path, error, protocol):
+        self.format = path
+        self.base_format = path
+        self.error = error
+        if path:
+            artifact_store.record(protocol, self.number, "extract", path, self.content_hash)
+
+    def reset_format(self, format):
+        # The section text changed: its format has to be extracted and merged again
+        self.format = format
+        self.base_format = format
+        self.merged = False
+        self.error = None
 
     def find_current_parent(self, node):
-        """Find the parent of the given node."""
-        for cl in self.children:
-            if cl.number == node.number:
-                return self
-            parent = cl.find_current_parent(node)
-            if parent:
-                return parent  # Return the parent found in the recursion
-        return None  # Return None if no parent is found
+        """Find the parent of the given node within this subtree."""
+        parent = node.parent
+        if parent and isdescendant(self, parent):
+            return parent
+        return None
             
-    def merge(self): #does not merge format, only doc summaries
-        if len(self.children) == 0:
-            return
-        content = ""
+    def child_summaries(self):
         summaries = ""
         child_sections = ""
-        child_titles = []
-        # print(f"here is the child for section: {self.number}")
         for child in self.children:
-            # print(child.number)
-            child.merge()
-            content += child.number + child.title +":\n" 
             summaries += child.summary+"\n"
             child_sections += child.number + child.title + "--" + child.summary + "\n"
-            child_titles.append(child.title)
+        return summaries, child_sections
+
+    def apply_hierachy(self, relationships):
+        for line in relationships.strip().split('\n'):
+            if "is the Parent of Section" in line:
+                if not (re.search(r'Section (\d+(?:\.\d+)*)', line) and re.search(r'of Section (\d+(?:\.\d+)*)', line)):
+                    continue
+                parent = re.search(r'Section (\d+(?:\.\d+)*)', line).group(1)
+                child = re.search(r'of Section (\d+(?:\.\d+)*)', line).group(1)
+                if self.number == parent:
+                    continue
+                child_node = self.find_child(child)
+                parent_node = self.find_child(parent)
+                if child_node is None or parent_node is None:
+                    continue
+                if isdescendant(parent_node, child_node):
+                    continue
+                current_parent = self.find_current_parent(child_node)
+                if current_parent:
+                    current_parent.remove_child(child) # Remove from current parent
+                parent_node.add_child(child_node)  # Add to new parent as per relationship
+                parent_node.merged = False
+
+    def nodes_by_depth(self, depth=0, levels=None):
+        if levels is None:
+            levels = []
+        if len(levels) <= depth:
+            levels.append([])
+        levels[depth].append(self)
+        for child in self.children:
+            child.nodes_by_depth(depth + 1, levels)
+        return levels
+
+    def merge(self): #does not merge format, only doc summaries
+        if len(self.children) == 0:
+            return
+        for child in self.children:
+            child.merge()
+        summaries, child_sections = self.child_summaries()
         self.summary = summary_subsections(self.title, summaries)     
 
         if len(self.children) > 1:
             print("hierachy result")
-            relationships = hierachy(child_sections)
-            for line in relationships.strip().split('\n'):
-                if "is the Parent of Section" in line:
-                    if not (re.search(r'Section (\d+(?:\.\d+)*)', line) and re.search(r'of Section (\d+(?:\.\d+)*)', line)):
-                        continue
-                    parent = re.search(r'Section (\d+(?:\.\d+)*)', line).group(1)
-                    child = re.search(r'of Section (\d+(?:\.\d+)*)', line).group(1)
-                    if self.number == parent:
-                        continue
-                    child_node = self.find_child(child)
-                    parent_node = self.find_child(parent)
-                    if child_node is None or parent_node is None:
-                        continue
-                    if isdescendant(parent_node, child_node):
-                        continue
-                    current_parent = self.find_current_parent(child_node)
-                    if current_parent:
-                        current_parent.remove_child(child) # Remove from current parent
-                    parent_node.add_child(child_node)  # Add to new parent as per relationship
+            self.apply_hierachy(hierachy(child_sections))
+
+    def collect_struct_names(self, struct_subsection_map):
+        # Same entries merge_child_formats adds, for subtrees merged by an earlier run
+        for child in self.children:
+            child.collect_struct_names(struct_subsection_map)
+        if not self.format or ".3d" not in self.format:
+            return
+        if self.children and self.format == self.base_format:
+            return
+        with open(self.format, 'r') as file:
+            format_content = file.read()
+        for struct_name in extract_struct_names(format_content) or []:
+            if not self.children or struct_name not in struct_subsection_map:
+                struct_subsection_map[struct_name] = self.number
+
+    def merge_child_formats(self, struct_subsection_map, protocol, checkpoint=None):
+        if self.merged:
+            print(f"Section {self.number} is already merged.")
+            self.collect_struct_names(struct_subsection_map)
+            return
 
-    def merge_child_formats(self, struct_subsection_map):
-        
         if len(self.children) == 0:
-            if ".3d" in self.format:
+            if self.format and ".3d" in self.format:
                 with open(self.format, 'r') as file:
                     format_content = file.read()
                     for struct_name in extract_struct_names(format_content):
                         struct_subsection_map[struct_name] = self.number
             return
         
-        if self.format and ".3d" in self.format:
+        for child in self.children:
+            child.merge_child_formats(struct_subsection_map, protocol, checkpoint)
+        path, error = self.merge_own_format()
+        self.set_merged_format(path, error, protocol)
+        if path and not error:
             with open(self.format, 'r') as file:
+                format_content = file.read()  # Reads the entire file
+                for struct_name in extract_struct_names(format_content):
+                    if struct_name not in struct_subsection_map:
+                        struct_subsection_map[struct_name] = self.number
+        if checkpoint:
+            checkpoint()
+
+    def merge_own_format(self):
+        """Merge the formats of the children, which must be merged already, into this section's own format.
+        Returns (path, error), path None if no child has a format. Leaves the node untouched."""
+        if self.base_format and ".3d" in self.base_format:
+            with open(self.base_format, 'r') as file:
                 self_format_content = file.read()
             combined_formats = "Root format: "+self.summary + self_format_content +'\n' +"child format:"
         else:
@@ -224,21 +385,33 @@ class SectionNode:
 
         has_child_format = False
         for child in self.children:
-            child.merge_child_formats(struct_subsection_map)
-            if ".3d" in child.format:
+            if child.format and ".3d" in child.format:
                 has_child_format = True
                 with open(child.format, 'r') as file:
                     child_format_content = file.read()
                 combined_formats = combined_formats + child.summary + child_format_content + '\n'
-
-        if has_child_format:  
-            merge_format(combined_formats)
-            self.format = get_most_recent_format()
-            with open(self.format, 'r') as file:
-                format_content = file.read()  # Reads the entire file
-                for struct_name in extract_struct_names(format_content):
-                    if struct_name not in struct_subsection_map:
-                        struct_subsection_map[struct_name] = self.number
+        if not has_child_format:
+            return None, None
+
+        try:
+            path = merge_format(combined_formats)
+        except RetryError as e:
+            print(f"Section {self.number}: format merge failed, keeping its own format.")
+            return None, f"merge: {e}"
+        if not path:
+            print(f"Section {self.number}: no merged format was verified, keeping its own format.")
+            return None, "merge: no verified format"
+        return path, None
+
+    def set_merged_format(self, path, error, protocol):
+        if error:
+            self.error = error
+            return
+        if path:
+            self.format = path
+            self.error = None
+            artifact_store.record(protocol, self.number, "merge", path)
+        self.merged = True
 
 class DocumentTree:
     def __init__(self, proto):
@@ -282,38 +455,185 @@ class DocumentTree:
             return json.dumps(self.root.to_dict(), indent=4)
     
     def save_to_file(self, filename, struct_subsection_map = None):
-        # Save the JSON output to a file
-        with open(filename, 'w') as file:
+        # Save the JSON output to a file, written aside and renamed so that a crash never leaves half a tree
+        with open(filename + '.tmp', 'w') as file:
             json_data = self.to_json()
             file.write(json_data)
-            print(f"Data saved to {filename}")
+        os.replace(filename + '.tmp', filename)
+        print(f"Data saved to {filename}")
 
-        if struct_subsection_map:
+        if struct_subsection_map is not None:
             # Merge: Save the dictionary to a file
-            with open('struct_subsection_map.json', 'w') as file:
+            with open('struct_subsection_map.json.tmp', 'w') as file:
                 json.dump(struct_subsection_map, file, indent=4)
+            os.replace('struct_subsection_map.json.tmp', 'struct_subsection_map.json')
             
     def load_from_file(self, filename):
         number_to_node = {}
         with open(filename, 'r') as file:
             data = json.load(file)
             self.root = SectionNode.from_dict(data, number_to_node)
+        self.sections = number_to_node
         return number_to_node
 
-    def merge(self):#does not merge format, only doc summaries
-        self.root.merge()
-
-    def generate_all_formats(self):
-        if self.root:
-            self.root.generate_format()
+    def merge(self, max_workers=LLM_CONCURRENCY, only=None):#does not merge format, only doc summaries
+        if max_workers <= 1 and only is None:
+            self.root.merge()
+            return
+        # A node only needs its children to be merged, so every level is merged in parallel, deepest first.
+        # Re-parenting only moves nodes below the current level, which are already done.
+        levels = self.root.nodes_by_depth()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for level in reversed(levels):
+                pending = []
+                for node in level:
+                    if len(node.children) == 0 or (only is not None and node not in only):
+                        continue
+                    summaries, child_sections = node.child_summaries()
+                    summary_future = executor.submit(summary_subsections, node.title, summaries)
+                    hierachy_future = executor.submit(hierachy, child_sections) if len(node.children) > 1 else None
+                    pending.append((node, summary_future, hierachy_future))
+                for node, summary_future, hierachy_future in pending:
+                    node.summary = summary_future.result()
+                    if hierachy_future:
+                        print("hierachy result")
+                        node.apply_hierachy(hierachy_future.result())
+
+    def ancestors(self, node):
+        ancestors = []
+        parent = node.parent
+        while parent:
+            ancestors.append(parent)
+            parent = parent.parent
+        return ancestors
+
+    def update_sections(self, sections, max_workers=LLM_CONCURRENCY):
+        """Bring a loaded tree up to date with the sections of the RFC.
+        Only changed sections and their ancestors are summarized, extracted and merged again.
+        Returns the number of changed sections."""
+        changed = []
+        for number, title, content in sections:
+            node = self.sections.get(number)
+            if node and node.content_hash == section_hash(title, content):
+                continue
+            if node is None:
+                print(f"Section {number} is new.")
+                node = SectionNode(number, title, content, None, None)
+                parent = self.sections.get('.'.join(number.split('.')[:-1]), self.root)
+                parent.add_child(node)
+                self.sections[number] = node
+            else:
+                print(f"Section {number} changed.")
+                node.title, node.content, node.content_hash = title, content, section_hash(title, content)
+            node.reset_format(initial_format(title, content))
+            changed.append(node)
+
+        numbers = set(section[0] for section in sections)
+        parents = []
+        for node in [n for n in self.sections.values() if n is not self.root and n.number not in numbers]:
+            print(f"Section {node.number} was removed.")
+            # Its subsections move up to its parent
+            parent = node.parent
+            parent.remove_child(node.number)
+            for child in node.children:
+                parent.add_child(child)
+            del self.sections[node.number]
+            parents.append(parent)
+
+        dirty = set()
+        for node in changed + [p for p in parents if p.number in self.sections]:
+            dirty.add(node)
+            dirty.update(self.ancestors(node))
+        if not dirty:
+            return 0
+
+        summaries = summary_all_sections([(n.number, n.title, n.content) for n in changed], max_workers)
+        for node, summary in zip(changed, summaries):
+            node.summary = summary
+        for node in dirty:
+            node.format = node.base_format
+            node.merged = False
+        self.merge(max_workers, only=dirty)
+        return len(changed) + len(parents)
+
+    def generate_all_formats(self, checkpoint=None, max_workers=LLM_CONCURRENCY):
+        # checkpoint() is called after every extraction, e.g. to save the tree
+        if not self.root:
+            return
+        if max_workers <= 1:
+            self.root.generate_format(self.protocol, checkpoint)
+            return
+        # Sections are extracted independently of each other. Every agent conversation gets the path of
+        # its own artifacts back, the results are attached to their node and saved on this thread only.
+        pending = [node for node in self.root.subtree() if node.format is None]
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {}
+        try:
+            for node in pending:
+                futures[executor.submit(node.extract_own_format, self.protocol)] = node
+            for future in as_completed(list(futures)):
+                node = futures.pop(future)
+                node.set_extracted_format(*future.result(), self.protocol)
+                if checkpoint:
+                    checkpoint()
+        finally:
+            # On a crash the extractions not started yet are dropped, the ones still running are kept
+            executor.shutdown(cancel_futures=True)
+            finished = [(f, node) for f, node in futures.items() if not f.cancelled() and f.exception() is None]
+            for future, node in finished:
+                node.set_extracted_format(*future.result(), self.protocol)
+            if finished and checkpoint:
+                checkpoint()
     
-    def merge_formats(self, struct_subsection_map):
-        self.root.merge_child_formats(struct_subsection_map)
+    def merge_formats(self, struct_subsection_map, checkpoint=None, max_workers=LLM_CONCURRENCY):
+        if max_workers <= 1:
+            self.root.merge_child_formats(struct_subsection_map, self.protocol, checkpoint)
+            return
+        # A section is merged as soon as all of its children are, sibling subtrees do not wait on each other
+        waiting = {} # node -> number of its children not merged yet
+        ready = []
+        def visit(node):
+            if node.merged or not node.children:
+                return False
+            waiting[node] = sum([visit(child) for child in node.children])
+            if waiting[node] == 0:
+                ready.append(node)
+            return True
+        visit(self.root)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {}
+        try:
+            for node in ready:
+                futures[executor.submit(node.merge_own_format)] = node
+            while futures:
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = futures.pop(future)
+                    node.set_merged_format(*future.result(), self.protocol)
+                    if checkpoint:
+                        checkpoint()
+                    if node.parent in waiting:
+                        waiting[node.parent] -= 1
+                        if waiting[node.parent] == 0:
+                            futures[executor.submit(node.parent.merge_own_format)] = node.parent
+        finally:
+            # Merges still running are kept, their parents are merged by the next run
+            executor.shutdown(cancel_futures=True)
+            finished = [(f, node) for f, node in futures.items() if not f.cancelled() and f.exception() is None]
+            for future, node in finished:
+                node.set_merged_format(*future.result(), self.protocol)
+            if finished and checkpoint:
+                checkpoint()
+        # Filled from the finished tree in post-order on this thread, the same map as a serial merge
+        self.root.collect_struct_names(struct_subsection_map)
 
     def refine(self, sectioncontent, parserlog):  
         with open(self.root.format, 'r') as file:
             old_format = file.read()
-        refine_format(old_format, sectioncontent, parserlog)
-        self.root.format = get_most_recent_format()
+        path = refine_format(old_format, sectioncontent, parserlog)
+        if path:
+            self.root.format = path
+            artifact_store.record(self.protocol, self.root.number, "refine", path)
 
 
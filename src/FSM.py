@@ -1,7 +1,55 @@
 from __future__ import annotations
+from toz3 import *
+# After the star import, z3 has functions named Union and Optional of its own
 from typing import List, Dict, Optional, Union
 from collections import deque
-from toz3 import *
+from dataclasses import dataclass
+
+# The steps a path through an FSM is made of
+
+@dataclass(frozen=True)
+class FieldStep:
+    name: str
+    type: str # UINT8BE .. UINT64BE, bitN, or a width in bits
+    condition: Optional[str]
+
+    @property
+    def width(self) -> Optional[int]:
+        # In bits, None if the type has no fixed width
+        if self.type in ("UINT8BE", "UINT16BE", "UINT32BE", "UINT64BE"):
+            return int(self.type[4:-2])
+        if self.type.startswith("bit"):
+            return int(self.type[3:])
+        if self.type.isdigit():
+            return int(self.type)
+        return None
+
+    def __str__(self):
+        return f"Node({self.name}, type={self.type}, condition={self.condition})"
+
+@dataclass(frozen=True)
+class CondStep:
+    condition: str
+
+    def __str__(self):
+        return f"[{self.condition}]"
+
+@dataclass(frozen=True)
+class FsmEnter:
+    name: str
+    size_expr: Optional[str]
+
+    def __str__(self):
+        return f"FSM_START({self.name}): {self.size_expr}"
+
+@dataclass(frozen=True)
+class FsmExit:
+    name: str
+
+    def __str__(self):
+        return f"FSM_END({self.name})"
+
+PathStep = Union[FieldStep, CondStep, FsmEnter, FsmExit]
 
 class Node: #children of Node can be Node or FSM
     def __init__(self, name: str, type: Optional[str], condition: Optional[str]):
@@ -43,6 +91,9 @@ class FSM:
     def addNexts(self, nexts: List[Union['Node', 'FSM']]):
         self.next.extend(nexts)
 
+    def instantiate(self, size_expr=None) -> 'FSMRef':
+        return FSMRef(self, size_expr)
+
     def __repr__(self):
         # Perform BFS to traverse the FSM starting from the entry node
         bfs_output = []
@@ -68,55 +119,166 @@ class FSM:
 
         return f"FSM({self.name}): " + " -> ".join(bfs_output)
 
-    def dfs(self, current: Union[Node, FSM], pathstr: List[str], saved_pathstr: List[List[str]], flag):
-        if current in self.exits:
-            flag = True
-
+    def path_step(self, current: Union[Node, FSM, FSMRef]) -> Optional[PathStep]:
+        # What current adds to a path, None for the start of an FSM and empty cases without a condition
         if isinstance(current, Node) and current.name != "start" and current.name != "empty":
-            pathstr.append(current.__repr__())
-            
+            return FieldStep(current.name, str(current.type), current.condition)
         elif isinstance(current, Node) and current.name == "empty":
             if current.condition:
-                pathstr.append(f"[{current.condition}]")
-
-        elif isinstance(current, FSM) and "emptyFSM" not in current.name:
-            pathstr.append(f"FSM_START({current.name}): {current.size_expr}")
-
-        elif isinstance(current, FSM) and "emptyFSM" in current.name:
+                return CondStep(current.condition)
+        elif isinstance(current, (FSM, FSMRef)) and "emptyFSM" not in current.name:
+            return FsmEnter(current.name, current.size_expr)
+        elif isinstance(current, (FSM, FSMRef)) and "emptyFSM" in current.name:
             if current.size_expr:
-                pathstr.append(f"[{current.size_expr} == 0]")
+                return CondStep(f"{current.size_expr} == 0")
+        return None
+
+    def dfs(self, current: Union[Node, FSM, FSMRef], prefix, flag):
+        """Yield the paths through current one at a time. A path is a linked (item, rest) tuple, read backwards,
+        so the paths below a node share its prefix instead of copying it."""
+        if current in self.exits:
+            flag = True
 
+        step = self.path_step(current)
+        if step is not None:
+            prefix = (step, prefix)
 
-        # If the current node has no children (leaf node), save the path
-        if isinstance(current, Node) and not current.transitions and flag:
-            saved_pathstr.append(pathstr.copy())
-          
-        # Continue DFS for all child nodes
         if isinstance(current, Node):
+            # If the current node has no children (leaf node), the path is complete
+            if not current.transitions and flag:
+                yield prefix
             for child, condition in current.transitions.items():
-                condition_str = f" [{condition}]" if condition else ""
-                self.dfs(child, pathstr + [condition_str], saved_pathstr, flag)
-        
-        elif isinstance(current, FSM):
-            entry_pathstrs = []
-            current.dfs(current.entry, pathstr.copy(), entry_pathstrs,  False)
+                yield from self.dfs(child, (CondStep(condition), prefix) if condition else prefix, flag)
+
+        elif isinstance(current, (FSM, FSMRef)):
+            # A reference walks the shared FSM, then goes on with what follows this use of it
+            fragment = current.fsm if isinstance(current, FSMRef) else current
+            for entry_prefix in fragment.dfs(fragment.entry, prefix, False):
+                if "emptyFSM" not in current.name:
+                    entry_prefix = (FsmExit(current.name), entry_prefix)
+                if not current.next:
+                    yield entry_prefix
+                # Continue each path of the nested FSM on each next FSM/node
+                for child in current.next:
+                    yield from self.dfs(child, entry_prefix, flag)
+
+    def iter_paths(self):
+        """Yield every path of the FSM as a list of PathSteps, computing the next one only when it is asked for."""
+        for prefix in self.dfs(self.entry, None, False):
+            path = []
+            while prefix is not None:
+                step, prefix = prefix
+                path.append(step)
+            path.reverse()
+            yield path
+
+    def save_all_paths(self):
+        return list(self.iter_paths())
+
+class FSMRef:
+    """One use of an FSM registered in an FSMRegistry. The registered FSM is shared by all its uses and never
+    changed once built, what differs per use (its size and what follows it) lives on the reference."""
+    def __init__(self, fsm: FSM, size_expr=None):
+        self.fsm = fsm
+        self.size_expr = size_expr
+        self.next: List[Union['Node', 'FSM', 'FSMRef']] = []
+
+    @property
+    def name(self):
+        return self.fsm.name
+
+    def addNext(self, next: Union['Node', 'FSM', 'FSMRef']):
+        self.next.append(next)
+
+    def addNexts(self, nexts: List[Union['Node', 'FSM', 'FSMRef']]):
+        self.next.extend(nexts)
+
+    def __repr__(self):
+        # Not expanded, the shared FSM prints once where it is defined
+        return f"FSMRef({self.name}, size={self.size_expr})"
+
+class PathCounter:
+    """Counts the paths FSM.dfs yields from every point of an FSM, by dynamic programming over the shared graph,
+    and builds single paths choosing one branch wherever the graph forks."""
+    def __init__(self, root: FSM):
+        self.root = root
+        self.counts = {}
+
+    def total(self) -> int:
+        return self.count(self.root, self.root.entry, False)
+
+    def count(self, fsm: FSM, current: Union[Node, FSM, FSMRef], flag) -> int:
+        # Same recursion as fsm.dfs(current, .., flag), adding up paths instead of yielding them
+        key = (fsm, current, flag)
+        if key not in self.counts:
+            if current in fsm.exits:
+                flag = True
+            if isinstance(current, Node):
+                total = 1 if not current.transitions and flag else 0
+                total += sum(n for _, n in self.options(fsm, current, flag))
+            else:
+                fragment = current.fsm if isinstance(current, FSMRef) else current
+                after = sum(n for _, n in self.options(fsm, current, flag)) if current.next else 1
+                total = self.count(fragment, fragment.entry, False) * after
+            self.counts[key] = total
+        return self.counts[key]
+
+    def options(self, fsm: FSM, current: Union[Node, FSM, FSMRef], flag):
+        """(child, number of paths) for every child a path can go on with after current."""
+        children = current.transitions if isinstance(current, Node) else current.next
+        options = []
+        for child in children:
+            n = self.count(fsm, child, flag)
+            if n > 0:
+                options.append((child, n))
+        return options
+
+    def walk(self, choose):
+        """Build one path. Where it forks choose(fsm, branch, flag, options) returns the child to go on with.
+        Returns the path and its arms, the (branch, child) choices made along it."""
+        path, arms = [], []
+        self._walk(self.root, self.root.entry, False, choose, path, arms)
+        return path, arms
+
+    def _walk(self, fsm, current, flag, choose, path, arms):
+        if current in fsm.exits:
+            flag = True
+        step = fsm.path_step(current)
+        if step is not None:
+            path.append(step)
+        if isinstance(current, (FSM, FSMRef)):
+            fragment = current.fsm if isinstance(current, FSMRef) else current
+            self._walk(fragment, fragment.entry, False, choose, path, arms)
             if "emptyFSM" not in current.name:
-                for entry_pathstr in entry_pathstrs:
-                    entry_pathstr.append(f"FSM_END({current.name})")
-           
+                path.append(FsmExit(current.name))
             if not current.next:
-                saved_pathstr.extend(entry_pathstrs)
-            else:
-            # For each path in entry_paths, continue DFS on each next FSM/node            
-                for i in range(len(entry_pathstrs)):
-                    for child in current.next:
-                        # Use the entry_path as the start for DFS on the child nodes/FSMs
-                        self.dfs(child, entry_pathstrs[i].copy(), saved_pathstr, flag)
+                return
+        elif not current.transitions:
+            return
+        options = self.options(fsm, current, flag)
+        if len(options) == 1:
+            child = options[0][0]
+        else:
+            child = choose(fsm, current, flag, options)
+            arms.append((current, child))
+        if isinstance(current, Node) and current.transitions[child]:
+            path.append(CondStep(current.transitions[child]))
+        self._walk(fsm, child, flag, choose, path, arms)
 
+class FSMRegistry:
+    """The FSMs of one parsed format by struct or casetype name. Every format gets its own, so formats
+    parsed one after the other, or at the same time on several threads, never see each other's structs."""
+    def __init__(self):
+        self.fsms: Dict[str, FSM] = {}
 
-    def save_all_paths(self):
-        saved_pathstrs = []
-        self.dfs(self.entry, [], saved_pathstrs, False)
-        return saved_pathstrs
+    def __contains__(self, name):
+        return name in self.fsms
+
+    def __getitem__(self, name) -> FSM:
+        return self.fsms[name]
+
+    def register(self, name, fsm: FSM):
+        self.fsms[name] = fsm
 
-FSM_map = {}
\ No newline at end of file
+    def instantiate(self, name, size_expr=None) -> FSMRef:
+        return self.fsms[name].instantiate(size_expr)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+_collector = threading.local()
+
+
+@contextmanager
+def collect_artifacts():
+    """Collect the .3d paths published by simple_parse on this thread, e.g. during one agent conversation."""
+    produced = []
+    previous = getattr(_collector, "produced", None)
+    _collector.produced = produced
+    try:
+        yield produced
+    finally:
+        _collector.produced = previous
+
+
+def artifact_name(module_name, code):
+    # Same module and code always land in the same directory, different code never does
+    return f"{module_name}_{hashlib.sha256(code.encode('utf-8')).hexdigest()}"
+
+
+def stored_code(path):
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class ArtifactStore:
+    """Content-hashed directories of verified 3D code plus an index of which (protocol, section, stage) produced which."""
+
+    def __init__(self, root):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self.index = None
+        self.lock = threading.Lock()
+
+    def staging_dir(self, module_name):
+        # Inside root so that publish can rename it into place
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkdtemp(prefix=f".staging_{module_name}_", dir=self.root)
+
+    def publish(self, module_name, code, staging):
+        """Move the artifacts in staging to the directory of code and return the path of its .3d file."""
+        dir_path = os.path.join(self.root, artifact_name(module_name, code))
+        path = os.path.join(dir_path, f"{module_name}.3d")
+        try:
+            os.rename(staging, dir_path)
+            print(f"Directory {dir_path} created.")
+        except OSError:
+            if stored_code(path) == code:
+                # Published before, by an earlier run or a concurrent job: same code, same artifacts
+                print(f"Directory {dir_path} already exists.")
+                shutil.rmtree(staging, ignore_errors=True)
+            else:
+                # Left incomplete by a crashed run, never reused
+                print(f"Directory {dir_path} does not hold this code, replacing it.")
+                shutil.rmtree(dir_path, ignore_errors=True)
+                os.rename(staging, dir_path)
+        produced = getattr(_collector, "produced", None)
+        if produced is not None:
+            produced.append(path)
+        return path
+
+    def _load_index(self):
+        if self.index is None:
+            self.index = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r") as f:
+                    self.index = json.load(f)
+        return self.index
+
+    def record(self, protocol, section, stage, path, content_hash=None):
+        """Index path as the latest result of stage for the section of protocol, content_hash is the section text it
+        was produced from."""
+        with self.lock:
+            index = self._load_index()
+            index[f"{protocol}|{section}|{stage}"] = {"path": path, "content_hash": content_hash}
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.index_path + ".tmp", "w") as f:
+                json.dump(index, f, indent=4)
+            os.replace(self.index_path + ".tmp", self.index_path)
+
+    def lookup(self, protocol, section, stage, content_hash):
+        """Path recorded for the same section text, or None if there is none or its artifacts are gone."""
+        with self.lock:
+            entry = self._load_index().get(f"{protocol}|{section}|{stage}")
+        if not isinstance(entry, dict) or entry["content_hash"] != content_hash or not os.path.exists(entry["path"]):
+            return None
+        return entry["path"]
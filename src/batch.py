@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import utils
+from llm_stats import llm_stats
+
+BATCH_RUNS_DIR = "runs"
+BATCH_JOBS = 4
+# Inputs every job reads plus the caches, which are safe to share between processes
+SHARED_PATHS = ["DSL", "example", "cache"]
+
+
+def absolute_command(command):
+    # Jobs run in their own directory, a parser given relative to the launch directory must still be found
+    executable, _, args = command.partition(" ")
+    if os.path.exists(executable) and not os.path.isabs(executable):
+        executable = os.path.abspath(executable)
+    return f"{executable} {args}".strip()
+
+
+def prepare_job_dir(protocol, runs_dir=BATCH_RUNS_DIR):
+    """runs/<protocol>/ gets its own RFC/, everparse_files/, struct_subsection_map.json and input.bin."""
+    job_dir = os.path.abspath(os.path.join(runs_dir, protocol))
+    os.makedirs(os.path.join(job_dir, "RFC"), exist_ok=True)
+    os.makedirs(os.path.join(job_dir, utils.EVERPARSE_FILES_DIR), exist_ok=True)
+    os.makedirs("cache", exist_ok=True)
+    for name in SHARED_PATHS:
+        link = os.path.join(job_dir, name)
+        if not os.path.lexists(link):
+            os.symlink(os.path.abspath(name), link)
+    return job_dir
+
+
+def run_job(protocol, rfc_file, command, job_dir, everparse_script):
+    # Runs in a fresh worker process: chdir and module state (stats, artifact index) stay with this job
+    os.chdir(job_dir)
+    utils.EVERPARSE_SCRIPT = everparse_script
+    from main import test
+
+    result = {"protocol": protocol, "job_dir": job_dir, "status": "done", "needs_refinement": None, "error": None}
+    start = time.time()
+    with open("pipeline.log", "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            result["needs_refinement"] = test(protocol, trace_file="llm_trace.jsonl", rfc_file=rfc_file, command=command)
+            if result["needs_refinement"] is None:
+                result["status"] = "no_format"
+        except Exception as e:
+            traceback.print_exc()
+            result["status"] = "failed"
+            result["error"] = repr(e)
+    result["elapsed"] = time.time() - start
+    result["llm"] = llm_stats.summary()
+    return result
+
+
+def run_batch(jobs, max_workers=BATCH_JOBS, runs_dir=BATCH_RUNS_DIR):
+    """Run the pipeline for every (protocol, rfc_file, command) job in parallel, returns the results per protocol."""
+    everparse_script = os.path.abspath(utils.EVERPARSE_SCRIPT)
+    results = {}
+    # One process per job, nothing a job leaves behind in module globals can reach the next one
+    with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1) as executor:
+        futures = {}
+        for protocol, rfc_file, command in jobs:
+            job_dir = prepare_job_dir(protocol, runs_dir)
+            future = executor.submit(run_job, protocol, os.path.abspath(rfc_file), absolute_command(command), job_dir, everparse_script)
+            futures[future] = protocol
+        for future in as_completed(futures):
+            protocol = futures[future]
+            try:
+                results[protocol] = future.result()
+            except Exception as e:
+                # The worker process itself died
+                results[protocol] = {"protocol": protocol, "status": "failed", "needs_refinement": None, "error": repr(e), "elapsed": 0.0, "llm": {}}
+            print(f"{protocol}: {results[protocol]['status']} after {results[protocol]['elapsed']:.1f}s")
+    with open(os.path.join(runs_dir, "results.json"), "w") as f:
+        json.dump(results, f, indent=4)
+    report(results)
+    return results
+
+
+def report(results):
+    print(f"{'protocol':<16} {'status':<10} {'refine':>6} {'llm calls':>9} {'cost($)':>8} {'time(s)':>8}")
+    for protocol in sorted(results):
+        result = results[protocol]
+        calls = sum(row["calls"] for row in result["llm"].values())
+        cost = sum(row["cost"] for row in result["llm"].values())
+        print(f"{protocol:<16} {result['status']:<10} {str(result['needs_refinement']):>6} {calls:>9} {cost:>8.3f} {result['elapsed']:>8.1f}")
+        if result["error"]:
+            print(f"  {result['error']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate several protocol parsers in parallel.")
+    parser.add_argument("--job", nargs=3, action="append", default=[], metavar=("PROTOCOL", "RFC_FILE", "COMMAND"))
+    parser.add_argument("--jobs-file", help='JSON list of {"protocol": .., "rfc": .., "command": ..}')
+    parser.add_argument("-j", "--parallel", type=int, default=BATCH_JOBS)
+    parser.add_argument("--runs-dir", default=BATCH_RUNS_DIR)
+    args = parser.parse_args()
+    jobs = [tuple(job) for job in args.job]
+    if args.jobs_file:
+        with open(args.jobs_file, "r") as f:
+            jobs += [(job["protocol"], job["rfc"], job["command"]) for job in json.load(f)]
+    if not jobs:
+        parser.error("no jobs given")
+    results = run_batch(jobs, args.parallel, args.runs_dir)
+    sys.exit(0 if all(result["status"] == "done" for result in results.values()) else 1)
@@ -0,0 +1,186 @@
+import re
+
+# A border may stop short, '+-+-+-+-' under a row that runs on past the diagram
+BORDER_PATTERN = re.compile(r'^\s*\+(?:-+\+)+-*\s*$')
+ROW_PATTERN = re.compile(r'^\s*[|~/:].*[|~/:]\s*$')
+# '|  Type  |  Length  |  Body...': a row left open, its last field has no fixed size
+OPEN_ROW_PATTERN = re.compile(r'^\s*\|.*[^|~/:\s]\s*$')
+# Anything starting like a diagram line, to notice the ones no diagram took in
+DIAGRAM_LINE_PATTERN = re.compile(r'^\s*(?:\+-|\|)')
+# '+   Source Address   +': separates the 32-bit rows of a tall field and may carry its label
+LABEL_PATTERN = re.compile(r'^\s*\+[^-+].*\+\s*$')
+# Underlying integer sizes a field or a group of bitfields can map to
+CANONICAL_WIDTHS = (8, 16, 32, 64)
+
+
+def identifier(text):
+    # 'Detect Mult' -> 'DetectMult'; capitalized, so never a 3D keyword such as type or this
+    words = re.findall(r'[A-Za-z0-9]+', text)
+    name = "".join(word[0].upper() + word[1:] for word in words) or "Field"
+    return "F" + name if name[0].isdigit() else name
+
+
+def is_row(line):
+    return bool(ROW_PATTERN.match(line) or OPEN_ROW_PATTERN.match(line))
+
+
+def find_diagrams(text):
+    """Return the bit diagrams in text, each as its list of border and row lines."""
+    diagrams = []
+    current = []
+    for line in text.split("\n"):
+        if BORDER_PATTERN.match(line) or is_row(line) or LABEL_PATTERN.match(line):
+            current.append(line)
+            continue
+        if any(BORDER_PATTERN.match(l) for l in current) and any(is_row(l) for l in current):
+            diagrams.append(current)
+        current = []
+    if any(BORDER_PATTERN.match(l) for l in current) and any(is_row(l) for l in current):
+        diagrams.append(current)
+    return diagrams
+
+
+def row_cells(line):
+    bars = [i for i, c in enumerate(line) if c == "|"]
+    cells = []
+    for start, end in zip(bars, bars[1:]):
+        if (end - start) % 2:
+            return None
+        cells.append((line[start + 1:end].strip(), (end - start) // 2))
+    return cells
+
+
+def parse_diagram(lines):
+    """Return the (text, bit offset, bit width) fields of a diagram, width None for variable-length fields.
+    Returns None if the diagram does not use the usual two characters per bit."""
+    # Bands are the lines between two dashed borders
+    bands = [[]]
+    for line in lines:
+        if BORDER_PATTERN.match(line):
+            bands.append([])
+        else:
+            bands[-1].append(line)
+
+    fields = []
+    offset = 0
+    full_row = False # the last field took a whole row by itself
+    for band in [band for band in bands if band]:
+        rows = [line for line in band if not LABEL_PATTERN.match(line)]
+        labels = [line.strip().strip("+").strip() for line in band if LABEL_PATTERN.match(line)]
+        if any(OPEN_ROW_PATTERN.match(line) for line in rows):
+            # The cells that are closed have their widths, the open end is a field of variable length
+            for line in rows:
+                line = line.rstrip()
+                end = line.rindex("|")
+                cells = row_cells(line[:end + 1])
+                if cells is None:
+                    return None
+                for text, width in cells:
+                    fields.append((text, offset, width))
+                    offset += width
+                text = line[end + 1:].strip().rstrip(". ")
+                if line[end + 1:].strip() and not (fields and fields[-1][2] is None):
+                    fields.append((text or "Data", offset, None))
+            full_row = False
+            continue
+        if any(line.strip()[0] != "|" or line.strip()[-1] != "|" for line in rows):
+            # ~ / or : edges mark a field of variable length
+            text = " ".join(t for t in [line.strip().strip("|~/: ") for line in band] if t.strip(". ")).strip(". ")
+            if text and not (fields and fields[-1][2] is None):
+                fields.append((text, offset, None))
+            full_row = False
+            continue
+        cells_per_row = [row_cells(line) for line in rows]
+        if any(cells is None for cells in cells_per_row):
+            return None
+        if len(rows) > 1 and all(len(cells) == 1 for cells in cells_per_row):
+            # One tall field, a row per 32 bits, labelled on any of its lines
+            text = " ".join(t for t in [cells[0][0] for cells in cells_per_row] + labels if t)
+            cells_per_row = [[(text, sum(cells[0][1] for cells in cells_per_row))]]
+        for cells in cells_per_row:
+            if len(cells) == 1 and full_row and fields[-1][2] is not None and (not cells[0][0] or cells[0][0] == fields[-1][0]):
+                # Unlabelled row right below a whole-row field: the field continues
+                text, field_offset, width = fields[-1]
+                fields[-1] = (text, field_offset, width + cells[0][1])
+                offset += cells[0][1]
+                continue
+            full_row = len(cells) == 1
+            for text, width in cells:
+                if text.endswith("..."):
+                    text = text.rstrip(". ")
+                    if text or not (fields and fields[-1][2] is None):
+                        fields.append((text or "Data", offset, None))
+                    full_row = False
+                    continue
+                fields.append((text, offset, width))
+                offset += width
+    return fields
+
+
+def emit_struct(struct_name, fields, entrypoint=False):
+    """Return (code, complete): complete is False if some fields could only be written as comments."""
+    used = set()
+    body = []
+    group = []
+    complete = True
+
+    def unique(text):
+        name = identifier(text)
+        candidate, i = name, 1
+        while candidate in used:
+            i += 1
+            candidate = f"{name}{i}"
+        used.add(candidate)
+        return candidate
+
+    for text, offset, width in fields:
+        # 'Type = 4' names the field Type and fixes its value
+        text, _, value = text.partition("=")
+        value = value.strip()
+        name = unique(text)
+        constraint = f" {{ {name} == {value} }}" if value.isdigit() or re.fullmatch(r'0x[0-9A-Fa-f]+', value) else ""
+        if width is None:
+            body.append(f"  // {name}: variable length, its size is not given by the diagram")
+            complete = False
+        elif not group and offset % 8 == 0 and width in CANONICAL_WIDTHS:
+            body.append(f"  UINT{width}BE {name}{constraint};")
+        elif not group and offset % 8 == 0 and width % 8 == 0:
+            body.append(f"  UINT8BE {name}[:byte-size {width // 8}];")
+        else:
+            # Bitfields are packed MSB first into the smallest canonical integer they fill exactly
+            group.append((name, offset, width, constraint))
+            total = sum(w for _, _, w, _ in group)
+            if total in CANONICAL_WIDTHS and group[0][1] % 8 == 0:
+                body += [f"  UINT{total}BE {n} : {w}{c};" for n, _, w, c in group]
+                group = []
+            elif total > 64:
+                body += [f"  // {n}: {w} bits at bit offset {o}" for n, o, w, _ in group]
+                group = []
+                complete = False
+    if group:
+        body += [f"  // {n}: {w} bits at bit offset {o}" for n, o, w, _ in group]
+        complete = False
+    prefix = "entrypoint " if entrypoint else ""
+    return f"{prefix}typedef struct _{struct_name} {{\n" + "\n".join(body) + f"\n}} {struct_name};\n", complete
+
+
+def compile_diagrams(text, title):
+    """Compile the bit diagrams of a section to 3D.
+    Returns (code, simple): simple if the section is one fixed layout the code describes completely,
+    code is None if the section has no diagram that can be parsed."""
+    diagrams = find_diagrams(text)
+    parsed = [fields for fields in (parse_diagram(lines) for lines in diagrams) if fields]
+    if not parsed:
+        return None, False
+    base_name = identifier(title)
+    structs = []
+    # Not simple either if a diagram could not be parsed or some diagram lines belong to no diagram
+    taken = sum(len(lines) for lines in diagrams)
+    stray = sum(1 for line in text.split("\n") if DIAGRAM_LINE_PATTERN.match(line)) > taken
+    simple = len(parsed) == 1 and len(diagrams) == 1 and not stray
+    for i, fields in enumerate(parsed):
+        struct_name = base_name if i == 0 else f"{base_name}{i + 1}"
+        code, complete = emit_struct(struct_name, fields, entrypoint=len(parsed) == 1)
+        structs.append(code)
+        simple = simple and complete and sum(width for _, _, width in fields) % 8 == 0
+    return "\n".join(structs), simple
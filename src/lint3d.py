@@ -0,0 +1,34 @@
+import re
+from verify_cache import normalize_3d
+
+# Mistakes from the developer prompt checklist that EverParse would reject anyway, as (pattern, feedback)
+LINT_RULES = [
+    (re.compile(r'\btype\b'),
+     "Syntax error, type is a reserved keyword. DO NOT use 'type' as an identifier! Use 'message_type' or 'Type' instead."),
+    (re.compile(r'\w\[(0|0:|)\]'),
+     "Do NOT initialize array with zero length! DONOT use 'UINT8BE Body[0];' or 'UINT8BE Body[0:];' or 'UINT8BE Body[];'"),
+    (re.compile(r'\?'),
+     "Ternary expressions like ? : are not supported in 3D, rewrite the constraint with && and ||."),
+    (re.compile(r'\[:\]'),
+     "Don't use '[:]' for array size, e.g. 'UINT8BE Data[:];', use '[:byte-size n]' instead."),
+    (re.compile(r'(?<![\w.])[A-Za-z_]\w*\.[A-Za-z_]\w*'),
+     "In 3D you can't access fields using '.' notation, struct.field is NOT VALID. Expand the struct fields within the current struct."),
+    (re.compile(r'\bdefault\s*:', re.IGNORECASE),
+     "Do not use 'Default:' in casetype, every case must be listed explicitly."),
+    (re.compile(r'typedef struct\{'),
+     "All defined structs must have names, e.g. typedef struct _NAME { } NAME;"),
+    (re.compile(r'\bstruct\{[^{}]*\};'),
+     "All defined structs must have names, e.g. a struct in a switch statement -> case VALUE: struct { } name;"),
+]
+
+
+def lint_3d(code):
+    """Return the checklist violations found in code, in milliseconds and without calling EverParse."""
+    normalized = normalize_3d(code)
+    problems = []
+    for pattern, feedback in LINT_RULES:
+        match = pattern.search(normalized)
+        if match and feedback not in problems:
+            problems.append(feedback)
+            print(f"3D lint: '{match.group(0)}' -> {feedback}")
+    return problems
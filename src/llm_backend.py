@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+import hashlib
+from types import SimpleNamespace
+from retry import FatalLLMError
+
+# live: call Bedrock. record: call Bedrock and save every response. replay: serve saved responses
+# without network access. scripted: canned answers, the agents submit SCRIPTED_3D_PATH to simple_parse.
+LLM_MODE = os.environ.get("PARCLEANSE_LLM_MODE", "live")
+RECORDINGS_DIR = os.environ.get("PARCLEANSE_LLM_RECORDINGS", "recordings/llm")
+REPLAY_LATENCY = float(os.environ.get("PARCLEANSE_REPLAY_LATENCY", "0"))
+SCRIPTED_3D_PATH = os.environ.get("PARCLEANSE_SCRIPTED_3D")
+
+DEFAULT_SCRIPTED_3D = """entrypoint typedef struct _ScriptedMessage {
+  UINT8BE Type;
+  UINT8BE Length;
+} ScriptedMessage;
+"""
+
+
+def normalize_messages(messages):
+    # Only what the model sees goes into the key: ids of tool calls change from run to run
+    normalized = []
+    for message in messages:
+        if isinstance(message, str):
+            normalized.append({"content": message})
+            continue
+        tool_calls = [(call["function"]["name"], call["function"]["arguments"]) for call in message.get("tool_calls") or []]
+        normalized.append({"role": message.get("role"), "content": message.get("content") or "", "tool_calls": tool_calls})
+    return normalized
+
+
+def request_key(messages):
+    return hashlib.sha256(json.dumps(normalize_messages(messages), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def save_recording(key, response):
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    path = os.path.join(RECORDINGS_DIR, key + ".json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(response, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def load_recording(key):
+    path = os.path.join(RECORDINGS_DIR, key + ".json")
+    if not os.path.exists(path):
+        # Fatal so that the retry policy does not wait for a recording that will never appear
+        raise FatalLLMError(f"No recorded LLM response {key} in {RECORDINGS_DIR}, run once with PARCLEANSE_LLM_MODE=record")
+    with open(path, "r") as f:
+        response = json.load(f)
+    if REPLAY_LATENCY:
+        time.sleep(REPLAY_LATENCY)
+    return response
+
+
+def scripted_3d():
+    if SCRIPTED_3D_PATH:
+        with open(SCRIPTED_3D_PATH, "r") as f:
+            return f.read()
+    return DEFAULT_SCRIPTED_3D
+
+
+def scripted_answer(prompt):
+    # Canned answers in the formats the askLLM callers parse
+    if "Return only a JSON object mapping every section number" in prompt:
+        numbers = re.findall(r'^\s*Section (\d+(?:\.\d+)*) .*:$', prompt, re.MULTILINE)
+        return json.dumps({number: "this secition decribes a part of the protocol." for number in numbers})
+    if "Parent-Child relationships" in prompt:
+        return "No Parent-Child relationships."
+    if "myformat or parser" in prompt:
+        return "parser is incorrect because the scripted backend always blames the parser."
+    return "this secition decribes a part of the protocol."
+
+
+def complete(messages, live_call):
+    """Answer an askLLM request with the configured backend. live_call() performs the real Bedrock query."""
+    if LLM_MODE == "live":
+        return live_call()
+    key = request_key(messages)
+    if LLM_MODE == "record":
+        text, usage, retries = live_call()
+        save_recording(key, {"content": text, "usage": usage})
+        return text, usage, retries
+    if LLM_MODE == "replay":
+        response = load_recording(key)
+        return response["content"], response.get("usage", {}), 0
+    if LLM_MODE == "scripted":
+        return scripted_answer(messages[-1]["content"]), {}, 0
+    raise ValueError(f"Unknown PARCLEANSE_LLM_MODE {LLM_MODE}")
+
+
+def expand_tool_responses(messages):
+    # Same flattening autogen applies before sending a conversation to the model
+    expanded = []
+    for message in messages:
+        tool_responses = message.get("tool_responses", [])
+        if tool_responses:
+            expanded += tool_responses
+            if message.get("role") != "tool":
+                expanded.append({key: message[key] for key in message if key != "tool_responses"})
+        else:
+            expanded.append(message)
+    return expanded
+
+
+class OfflineModelClient:
+    """autogen model client serving agent rounds from recordings (replay) or canned 3D code (scripted)."""
+
+    def __init__(self, config, **kwargs):
+        self.model = config.get("model", LLM_MODE)
+
+    def create(self, params):
+        messages = params["messages"]
+        if LLM_MODE == "replay":
+            reply = load_recording(request_key(messages))
+        else:
+            reply = self.scripted_reply(messages)
+        message = {"role": "assistant", "content": reply.get("content")}
+        if reply.get("tool_calls"):
+            message["tool_calls"] = [
+                {"id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": arguments}}
+                for i, (name, arguments) in enumerate(reply["tool_calls"])
+            ]
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], model=self.model, cost=0)
+
+    @staticmethod
+    def scripted_reply(messages):
+        # First round submits the canned 3D, once simple_parse has answered the conversation is over
+        if any(message.get("role") == "tool" for message in messages):
+            return {"content": "TERMINATE"}
+        arguments = json.dumps({"code": scripted_3d(), "module_name": "SCRIPTED"})
+        return {"content": None, "tool_calls": [("simple_parse", arguments)]}
+
+    def message_retrieval(self, response):
+        return [choice.message for choice in response.choices]
+
+    def cost(self, response):
+        return 0
+
+    @staticmethod
+    def get_usage(response):
+        return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost": 0, "model": response.model}
+
+
+def agent_llm_config(config_list):
+    if LLM_MODE in ("replay", "scripted"):
+        # cache_seed None: autogen's own response cache would hide what the backend serves
+        return {"config_list": [{"model": config.get("model", LLM_MODE), "model_client_cls": "OfflineModelClient"} for config in config_list], "cache_seed": None}
+    return {"config_list": config_list}
+
+
+def register_agent_backend(engineer):
+    if LLM_MODE in ("replay", "scripted"):
+        engineer.register_model_client(model_client_cls=OfflineModelClient)
+    elif LLM_MODE == "record":
+        def record_reply(sender, message, recipient, silent):
+            # Keyed like OfflineModelClient.create will see it: system message plus the flattened conversation
+            history = sender._oai_system_message + expand_tool_responses(sender._oai_messages[recipient])
+            reply = {"content": message} if isinstance(message, str) else {
+                "content": message.get("content"),
+                "tool_calls": normalize_messages([message])[0]["tool_calls"],
+            }
+            save_recording(request_key(history), reply)
+            return message
+        engineer.register_hook("process_message_before_send", record_reply)
@@ -0,0 +1,107 @@
+import os
+import time
+import json
+import hashlib
+import sqlite3
+import threading
+
+
+def make_key(model_id, body):
+    # The request body carries the prompt and every sampling parameter, so two
+    # requests with the same key are guaranteed to get the same (temperature 0) answer
+    digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{model_id}:{digest}"
+
+
+class LLMCache:
+    """Disk-backed LRU cache of LLM responses, stored in a single sqlite file.
+    The file may be shared by several processes (batch jobs): a lock held too long by another one makes a lookup a
+    miss and a store a no-op, it never fails the LLM call."""
+
+    def __init__(self, path, max_bytes, timeout=30.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self):
+        # Open lazily so importing utils never touches the disk
+        if self.conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            # Readers never wait on the writer, writers only on each other
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model_id TEXT, response TEXT, "
+                "size INTEGER, last_access INTEGER)"
+            )
+            conn.commit()
+            self.conn = conn
+        return self.conn
+
+    def get(self, key):
+        with self.lock:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    # LRU bookkeeping, a write: under contention it is where the lock error comes from
+                    conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time_ns(), key))
+                    conn.commit()
+            except sqlite3.OperationalError as e:
+                self._rollback()
+                print(f"LLM cache: lookup failed ({e}), treated as a miss.")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model_id, response):
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, model_id, response, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, model_id, response, size, time.time_ns()),
+                )
+                self._evict(conn)
+                conn.commit()
+            except sqlite3.OperationalError as e:
+                self._rollback()
+                print(f"LLM cache: store failed ({e}), response not cached.")
+
+    def _rollback(self):
+        if self.conn is not None:
+            try:
+                self.conn.rollback()
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, conn):
+        # Drop least recently used entries until the cache fits in max_bytes again
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        print(f"LLM cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), {self.evictions} evictions")
@@ -0,0 +1,115 @@
+import json
+import time
+import threading
+
+# Pipeline stages every LLM call is tagged with
+STAGES = ["summary", "hierarchy", "extract", "merge", "refine", "mismatch"]
+# Stage of calls recorded without one
+OTHER_STAGE = "other"
+
+# USD per 1K tokens as (input, output); unknown models are reported with zero cost
+MODEL_PRICES = {
+    "anthropic.claude-3-5-sonnet-20241022-v2:0": (0.003, 0.015),
+}
+
+
+class LLMStats:
+    """Collects latency, token and cost figures for every LLM call of a run."""
+
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+        self.trace_path = None
+
+    def enable_trace(self, path):
+        # Every record is also appended to this JSONL file for offline analysis
+        self.trace_path = path
+
+    def record(self, stage, model_id, latency, input_tokens, output_tokens, retries=0, cached=False, kind="call", saved_tokens=0):
+        price_in, price_out = MODEL_PRICES.get(model_id, (0.0, 0.0))
+        entry = {
+            "time": time.time(),
+            "stage": stage or OTHER_STAGE,
+            "kind": kind,
+            "model_id": model_id,
+            "latency": latency,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "retries": retries,
+            "cached": cached,
+            "saved_tokens": saved_tokens, # prompt tokens not sent thanks to prompt_builder
+            "cost": input_tokens / 1000 * price_in + output_tokens / 1000 * price_out,
+        }
+        with self.lock:
+            self.records.append(entry)
+            if self.trace_path:
+                with open(self.trace_path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def summary(self):
+        table = {}
+        for entry in self.records:
+            row = table.setdefault(entry["stage"], {
+                "calls": 0, "cached": 0, "retries": 0, "input_tokens": 0,
+                "output_tokens": 0, "saved_tokens": 0, "latency": 0.0, "cost": 0.0,
+            })
+            row["calls"] += 1
+            row["cached"] += int(entry["cached"])
+            row["retries"] += entry["retries"]
+            row["input_tokens"] += entry["input_tokens"]
+            row["output_tokens"] += entry["output_tokens"]
+            row["saved_tokens"] += entry["saved_tokens"]
+            row["latency"] += entry["latency"]
+            row["cost"] += entry["cost"]
+        return table
+
+    def report(self):
+        table = self.summary()
+        stages = [s for s in STAGES if s in table] + sorted(s for s in table if s not in STAGES)
+        print(f"{'stage':<10} {'calls':>6} {'cached':>6} {'retries':>7} {'in tok':>9} {'out tok':>8} {'saved tok':>9} {'latency(s)':>10} {'avg(s)':>7} {'cost($)':>8}")
+        totals = {"calls": 0, "cached": 0, "retries": 0, "input_tokens": 0, "output_tokens": 0, "saved_tokens": 0, "latency": 0.0, "cost": 0.0}
+        for stage in stages:
+            row = table[stage]
+            for k in totals:
+                totals[k] += row[k]
+            self._print_row(stage, row)
+        self._print_row("total", totals)
+
+    @staticmethod
+    def _print_row(name, row):
+        avg = row["latency"] / row["calls"] if row["calls"] else 0.0
+        print(f"{name:<10} {row['calls']:>6} {row['cached']:>6} {row['retries']:>7} {row['input_tokens']:>9} {row['output_tokens']:>8} {row['saved_tokens']:>9} {row['latency']:>10.1f} {avg:>7.2f} {row['cost']:>8.3f}")
+
+
+llm_stats = LLMStats()
+
+
+def _usage_totals(agent):
+    # autogen keeps a running usage summary per client: {"total_cost": x, model: {"prompt_tokens": .., "completion_tokens": ..}}
+    client = getattr(agent, "client", None)
+    summary = getattr(client, "total_usage_summary", None) if client else None
+    if not summary:
+        return 0, 0
+    usages = [v for v in summary.values() if isinstance(v, dict)]
+    return sum(u.get("prompt_tokens", 0) for u in usages), sum(u.get("completion_tokens", 0) for u in usages)
+
+
+def track_agent_rounds(stage, engineer, executor, model_id, saved_tokens=0):
+    """Record one entry per LLM round of an autogen conversation between engineer and executor."""
+    state = {"start": time.time(), "usage": _usage_totals(engineer)}
+
+    def on_executor_send(sender, message, recipient, silent):
+        # The executor just handed the turn over, the next engineer reply is one LLM round
+        state["start"] = time.time()
+        return message
+
+    def on_engineer_send(sender, message, recipient, silent):
+        usage = _usage_totals(engineer)
+        llm_stats.record(stage, model_id, time.time() - state["start"], usage[0] - state["usage"][0],
+                         usage[1] - state["usage"][1], kind="agent_round", saved_tokens=saved_tokens)
+        state["usage"] = usage
+        return message
+
+    executor.register_hook("process_message_before_send", on_executor_send)
+    engineer.register_hook("process_message_before_send", on_engineer_send)
@@ -2,79 +2,48 @@ import re
 from DocumentTree import *
 import sys
 import os
+import argparse
 from parseformat import test_and_refine_format
+from rfc_stream import stream_rfc, read_sections
+from pipeline import Stage, Pipeline
+from utils import llm_cache, everparse_cache, LLM_CONCURRENCY
+from llm_stats import llm_stats
 
 sys.path.append(os.path.abspath('../../'))
 
-def clean_text(filename):
-    with open(filename, 'r', encoding='utf-8') as file:
-        file_content = file.read()
-
-        header_pattern = re.compile(r'RFC (\d+)\s+(.*?)\s+([A-Za-z]+ \d{4})')
-        footer_pattern = re.compile(r'^.*\s+\[Page \d+\]$', re.MULTILINE)
-
-        text = header_pattern.sub('', file_content)
-        text = footer_pattern.sub('', text)
-
-        text = re.sub(r'\n\s*\n', '\n', text)
-        return text.strip()
-    
 def handle_doc(readfile, writefile):
-    # step 1: clean document
-    document_text = clean_text(readfile)
-
-    with open(writefile, 'w', encoding='utf-8') as cleaned_file:
-        cleaned_file.write(document_text)
-
+    # step 1: clean document, step 2: segmentation to sections, both streamed line by line
+    sections = list(stream_rfc(readfile, writefile))
     print(f"Cleaned content written to {writefile}")
-
-    # step 2: segmentation to sections
-    # Adjusted regex pattern to capture section numbers more reliably, including standalone section titles
-    section_header_pattern = re.compile(r'^(\d+(?:\.\d+)*)(\.?)\s+(.*)$', re.MULTILINE)
-    
-    headers = list(section_header_pattern.finditer(document_text))
-    sections = []
-
-    for i, match in enumerate(headers):
-        start_index = match.end()
-        # Adjust to find the start of the next section considering document structure
-        end_index = headers[i + 1].start() if (i + 1) < len(headers) else len(document_text)
-        
-        # Extract section number and title, and trim content accurately
-        section_number = match.group(1)
-        section_title = match.group(3).strip()
-        section_content = document_text[start_index:end_index].strip()
-        sections.append((section_number, section_title, section_content))
     return sections
 
-def build_doc_tree(protocol, sections, doc_file):
+def build_doc_tree(protocol, sections, doc_file, max_workers=LLM_CONCURRENCY):
     doc_tree = DocumentTree(protocol)
     # Generate new json tree
     if not os.path.exists(doc_file):       
-        for section in sections:       
-            if section[2]!="":
-                summary = summary_section(section)
-            else:
-                summary = None
-            if not contains_table(section[2]):
-                init_format = section[1]
-            else:
-                init_format = None
-            doc_tree.add_section(section[0], section[1], section[2], summary, init_format) 
-        doc_tree.merge()
+        summaries = summary_all_sections(sections, max_workers)
+        for section, summary in zip(sections, summaries):       
+            doc_tree.add_section(section[0], section[1], section[2], summary, initial_format(section[1], section[2])) 
+        doc_tree.merge(max_workers)
         doc_tree.display()
         doc_tree.save_to_file(doc_file) 
     
     else:
         print("Doc tree exists!!!")
+        # Reuse everything of the sections whose text did not change
+        doc_tree.load_from_file(doc_file)
+        if doc_tree.update_sections(sections, max_workers):
+            doc_tree.display()
+            doc_tree.save_to_file(doc_file)
 
-def extract_format_from_doc(protocol, doc_file):
+def extract_format_from_doc(protocol, doc_file, max_workers=LLM_CONCURRENCY):
     doc_tree = DocumentTree(protocol)
     if os.path.exists(doc_file):
         doc_tree.load_from_file(doc_file)
         if doc_tree.root:
             print("Document tree loaded successfully.")
-            doc_tree.generate_all_formats()
+            # Saved after every section, a crash loses at most the extractions in progress
+            doc_tree.generate_all_formats(checkpoint=lambda: doc_tree.save_to_file(doc_file), max_workers=max_workers)
             doc_tree.display()
             doc_tree.save_to_file(doc_file) 
             return doc_tree
@@ -87,16 +56,15 @@ def extract_format_from_doc(protocol, doc_file):
         print("error! Doc tree not exist!!!")
         return None
 
-def merge_format_in_doc_tree(protocol, doc_file, struct_subsection_map):
+def merge_format_in_doc_tree(protocol, doc_file, struct_subsection_map, max_workers=LLM_CONCURRENCY):
     doc_tree = DocumentTree(protocol)
     if os.path.exists(doc_file):
         doc_tree.load_from_file(doc_file)
         if doc_tree.root:
             print("Document tree loaded successfully.")
-            if "everparse_files" in doc_tree.root.format:
-                print("Merged formats detected! No need to merge again.")
-                return doc_tree
-            doc_tree.merge_formats(struct_subsection_map)
+            if doc_tree.root.merged:
+                print("Merged formats detected! Only collecting struct names.")
+            doc_tree.merge_formats(struct_subsection_map, checkpoint=lambda: doc_tree.save_to_file(doc_file), max_workers=max_workers)
             doc_tree.display()
             doc_tree.save_to_file(doc_file, struct_subsection_map) 
             return doc_tree
@@ -109,33 +77,66 @@ def merge_format_in_doc_tree(protocol, doc_file, struct_subsection_map):
         print("error! Doc tree not exist!!!")
         return None
 
-def test(protocol):
-    read_file_name = f'RFC/{protocol}.txt'
+def test_format(protocol, doc_file, command):
+    # step 4: test implementation and refine the format
+    doc_tree = DocumentTree(protocol)
+    if os.path.exists(doc_file):
+        doc_tree.load_from_file(doc_file)
+    if not doc_tree.root.format or ".3d" not in doc_tree.root.format:
+        print(f"No merged format for {protocol}: {doc_tree.root.error}")
+        return None
+    with open(doc_tree.root.format, 'r') as file:
+        format_content = file.read()
+    return test_and_refine_format(doc_file, format_content, protocol, command)
+
+def test(protocol, trace_file=None, rfc_file=None, command="..", resume=False):
+    """Run the whole pipeline for one protocol. command is the parser executable under test.
+    With resume, stages completed by an earlier run are skipped.
+    Returns whether the format still needs refinement, None if no merged format could be built."""
+    if trace_file:
+        llm_stats.enable_trace(trace_file)
+    read_file_name = rfc_file or f'RFC/{protocol}.txt'
     write_file_name = f'RFC/cleaned_{protocol}.txt'
     match = re.search(r'/([^/]+)\.txt$', read_file_name)
     doc_file = f'RFC/{match.group(1)}.json'
+    map_file = 'struct_subsection_map.json'
+
     # step 0: clean document
-    sections = handle_doc(read_file_name, write_file_name)
+    def clean(context):
+        return len(handle_doc(read_file_name, write_file_name))
     # step 1: build doc tree without generate format
-    build_doc_tree(protocol,sections, doc_file)
+    def build(context):
+        build_doc_tree(protocol, list(read_sections(write_file_name)), doc_file)
     # step 2: generate format for each treenode, not merge
-    extract_format_from_doc(protocol, doc_file)
-    flag = True
-    while(flag):
-        struct_subsection_map = {}
-        # step 3: merge format until root
-        doc_tree = merge_format_in_doc_tree(protocol, doc_file, struct_subsection_map)
-        # step 4: test implementation and refine the format
-        doc_tree = DocumentTree(protocol)
-        if os.path.exists(doc_file):
-            doc_tree.load_from_file(doc_file)
-        with open(doc_tree.root.format, 'r') as file:
-            format_content = file.read()
-        command = ".." # This should be the exe for the parser
-        flag  = test_and_refine_format(doc_file, format_content, protocol, command)
-        return
-
-test("BFD")
-
-
-
+    def extract(context):
+        extract_format_from_doc(protocol, doc_file)
+    # step 3: merge format until root
+    def merge(context):
+        merge_format_in_doc_tree(protocol, doc_file, {})
+    # step 4: test implementation and refine the format
+    def check(context):
+        return test_format(protocol, doc_file, command)
+
+    stages = [
+        Stage("clean", [read_file_name], [write_file_name], clean),
+        Stage("build", [write_file_name], [doc_file], build),
+        Stage("extract", [doc_file], [doc_file], extract),
+        Stage("merge", [doc_file], [doc_file, map_file], merge),
+        Stage("test", [doc_file, map_file], [], check),
+    ]
+    pipeline = Pipeline(stages, f'RFC/{match.group(1)}.state.json')
+    context = pipeline.run({"protocol": protocol, "command": command}, resume)
+    llm_cache.report()
+    everparse_cache.report()
+    llm_stats.report()
+    return context["test"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate a protocol parser against its RFC.")
+    parser.add_argument("protocol", nargs="?", default="BFD")
+    parser.add_argument("--rfc", help="RFC text, RFC/<protocol>.txt by default")
+    parser.add_argument("--command", default="..", help="parser executable under test")
+    parser.add_argument("--trace", help="append every LLM call to this JSONL file")
+    parser.add_argument("--resume", action="store_true", help="skip the stages an earlier run completed")
+    args = parser.parse_args()
+    test(args.protocol, args.trace, args.rfc, args.command, args.resume)
@@ -1,9 +1,13 @@
 import os
-import time
 import autogen
 import sys
 sys.path.append(os.path.abspath('../../'))
 from utils import simple_parse, config_list
+from llm_stats import track_agent_rounds
+from retry import run_with_retry, AGENT_RETRY_POLICY
+from prompt_builder import build_prompt_parts
+from llm_backend import agent_llm_config, register_agent_backend
+from artifact_store import collect_artifacts
 
 def get_task_prompt(formats):
     task_prompt = f"""You are tasked with merging multiple 3D formats into a single comprehensive format. Your task is to:
@@ -34,10 +38,10 @@ def get_developer_prompt(manual, example):
     """
     return developer_prompt
 
-def agent_config(manual, example):
+def agent_config(manual, example, saved_chars=0):
     engineer = autogen.AssistantAgent(
         name="Developer",
-        llm_config={"config_list": config_list},
+        llm_config=agent_llm_config(config_list),
         is_termination_msg=lambda x: x.get("content", "") and "EverParse succeeded!" in x.get("content", "").rstrip(),
         max_consecutive_auto_reply = 15,
         system_message=get_developer_prompt(manual, example),
@@ -51,28 +55,24 @@ def agent_config(manual, example):
 
     engineer.register_for_llm(name="simple_parse", description="Parse the 3D code and return the result. If the code is syntactically correct, return 'EverParse succeeded!'. If there are syntax errors, return the error message.")(simple_parse)
     executor.register_for_execution(name="simple_parse")(simple_parse)
+    register_agent_backend(engineer)
+    track_agent_rounds("merge", engineer, executor, config_list[0].get("model"), saved_tokens=saved_chars // 4)
     return [engineer, executor]
 
-def agent_loop(manual, rfc, example):
-    agent_list = agent_config(manual, example)
+def agent_loop(manual, rfc, example, saved_chars=0):
+    agent_list = agent_config(manual, example, saved_chars)
 
-    agent_list[1].initiate_chat(
-    agent_list[0],
-    message=get_task_prompt(rfc)
-    )
+    # The .3d files simple_parse verified during this conversation, the last one is the answer
+    with collect_artifacts() as produced:
+        agent_list[1].initiate_chat(
+        agent_list[0],
+        message=get_task_prompt(rfc)
+        )
+    return produced[-1] if produced else None
 
 def merge_format(rfc):
-    request_success = False
-    with open("DSL/3d_syntax_check.txt", "r") as f:
-        manual = f.read()
-    with open("example/example_merge.txt", "r") as f:
-        example = f.read()
-    while not request_success:
-        try:
-            agent_loop(manual, rfc, example)
-            request_success = True
-        except Exception as e:
-            print(f"Error: {e}")
-            print("Retrying......")
-            time.sleep(10)
-            continue
+    # Only the manual rules and examples relevant to the constructs in this section are sent
+    manual, example, saved_chars = build_prompt_parts(rfc, "example/example_merge.txt")
+    # Raises RetryError once the attempt budget is used up, callers record the failure and move on
+    path, _ = run_with_retry(lambda: agent_loop(manual, rfc, example, saved_chars), AGENT_RETRY_POLICY, "merge_format")
+    return path
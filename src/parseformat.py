@@ -1,5 +1,7 @@
 import re
 from FSM import *
+from path_sampling import select_paths
+from utils import PATH_BUDGET, PATH_STRATEGY, PATH_SEED
 from typing import Optional, Union, List
 
 def find_matching_brace(text, start_index):
@@ -14,7 +16,7 @@ def find_matching_brace(text, start_index):
                 return i
     return -1  # Return -1 if no matching brace is found
 
-def parse_simple_line(line) -> Optional[Union[List['Node'], List['FSM']]]:
+def parse_simple_line(line, registry) -> Optional[Union[List['Node'], List['FSM']]]:
     # pattern = r'(\w+)\s+(\w+)\s*\{\s*([^}]+)\s*\}\s*;\s*//.*'
     pattern = r'(\w+)\s+(\w+)(?:\s*\{\s*([^}]+)\s*\})?\s*;'
     # Use the regex to search the line
@@ -31,10 +33,10 @@ def parse_simple_line(line) -> Optional[Union[List['Node'], List['FSM']]]:
         
         else:
             # Attempt to find and parse the struct definition for this type
-            if data_type in FSM_map:
-                return [copy.deepcopy(FSM_map[data_type])]
+            if data_type in registry:
+                return [registry.instantiate(data_type)]
             else:
-                print(f"cannot find {data_type} in FSM_map")
+                print(f"cannot find {data_type} in the FSM registry")
                 return None
     patternbit = r"(\w+)\s+(\w+)\s*:\s*(\d+)\s*(?:\{\s*([^}]+)\s*\})?\s*;"
     matchbit = re.search(patternbit, line)
@@ -50,7 +52,7 @@ def parse_simple_line(line) -> Optional[Union[List['Node'], List['FSM']]]:
             return None
     return None
 
-def parse_array_line(line, array_names) -> Optional[Union[List['Node'], List['FSM']]]:
+def parse_array_line(line, array_names, registry) -> Optional[Union[List['Node'], List['FSM']]]:
     # Define a regex pattern for identifying variable byte arrays
     array_pattern = re.compile(
     r"(\w+)\s+"                  # Match any word as the data type (e.g., UINT16BE)
@@ -76,11 +78,10 @@ def parse_array_line(line, array_names) -> Optional[Union[List['Node'], List['FS
             elif array_type == "UINT64BE":
                 return [Node("empty", None, None), Node(array_name, array_type, None)]
             else:
-                if array_type in FSM_map:
-                    struct_fsm = copy.deepcopy(FSM_map[array_type])
-                    struct_fsm.size_expr = None
+                if array_type in registry:
+                    struct_fsm = registry.instantiate(array_type)
                 else:
-                    raise ValueError(f"cannot find {array_type} in FSM_map")
+                    raise ValueError(f"cannot find {array_type} in the FSM registry")
                     return None
 
                 return [FSM(f"emptyFSM_{array_type}", None), struct_fsm]
@@ -95,11 +96,10 @@ def parse_array_line(line, array_names) -> Optional[Union[List['Node'], List['FS
             elif array_type == "UINT64BE":
                 return [Node("empty", None, f"{size_expression} == 0"), Node(array_name, array_type, f"{size_expression} == 8")]
             else:
-                if array_type in FSM_map:
-                    struct_fsm = copy.deepcopy(FSM_map[array_type])
-                    struct_fsm.size_expr = size_expression
+                if array_type in registry:
+                    struct_fsm = registry.instantiate(array_type, size_expression)
                 else:
-                    raise ValueError(f"cannot find {array_type} in FSM_map")
+                    raise ValueError(f"cannot find {array_type} in the FSM registry")
                     return None
 
                 return [FSM(f"emptyFSM_{array_type}", size_expression), struct_fsm]
@@ -129,7 +129,7 @@ def parse_array_line(line, array_names) -> Optional[Union[List['Node'], List['FS
     else:
         return None  
 
-def parse_casetype_line(line) -> Optional[List['FSM']]:
+def parse_casetype_line(line, registry) -> Optional[List['FSM']]:
     pattern = r'(\w+)\(([\w\s,]+)\)\s+(\w+);'
     match = re.match(pattern, line.strip())
     
@@ -138,27 +138,27 @@ def parse_casetype_line(line) -> Optional[List['FSM']]:
         params = match.group(2)     # e.g., Type, Length
         name = match.group(3)       # e.g., message
         
-        return [copy.deepcopy(FSM_map[data_type])]
+        return [registry.instantiate(data_type)]
 
     else:
         return None
 
-def parse_line(line, array_names)-> Optional[Union[List['Node'], List['FSM']]]:
-    is_simple_line = parse_simple_line(line)
+def parse_line(line, array_names, registry)-> Optional[Union[List['Node'], List['FSM']]]:
+    is_simple_line = parse_simple_line(line, registry)
     if is_simple_line:
         return is_simple_line
     
-    is_array_line = parse_array_line(line, array_names)
+    is_array_line = parse_array_line(line, array_names, registry)
     if is_array_line:
         return is_array_line
     
-    is_casetype_line = parse_casetype_line(line)
+    is_casetype_line = parse_casetype_line(line, registry)
     if is_casetype_line:
         return is_casetype_line
     
     raise ValueError(f"unhandled case! {line}")
 
-def parse_struct(module, array_names) -> FSM:
+def parse_struct(module, array_names, registry) -> FSM:
     struct_pattern = re.compile(
     r"typedef\s+struct\s+_(\w+)\s*(?:\([^)]*\))?\s*{\s*(.*?)\s*}\s*(\w+);", re.DOTALL
     )
@@ -185,14 +185,14 @@ def parse_struct(module, array_names) -> FSM:
         brace_depth += stripped.count("{") - stripped.count("}")
 
         if brace_depth == 0:
-            node_or_FSM_list = parse_line(buffer.strip(), array_names)
+            node_or_FSM_list = parse_line(buffer.strip(), array_names, registry)
             fsm.addlists(node_or_FSM_list)
             buffer = ""
     
-    FSM_map[struct_name] = fsm       
+    registry.register(struct_name, fsm)
     return fsm  
 
-def parse_casebody(casebody_str, array_names) -> FSM:
+def parse_casebody(casebody_str, array_names, registry) -> FSM:
     unit_pattern = r'unit\s+(\w+);'
     unit_match = re.match(unit_pattern, casebody_str.strip())
     if unit_match:
@@ -235,12 +235,12 @@ def parse_casebody(casebody_str, array_names) -> FSM:
 
                     if brace_depth == 0:
                         # We have a complete line to parse
-                        nodelist = parse_line(buffer, array_names)
+                        nodelist = parse_line(buffer, array_names, registry)
                         fsm.addlists(nodelist)
                         buffer = ""  # Reset the buffer for the next line
                    
 
-                FSM_map[struct_name] = fsm
+                registry.register(struct_name, fsm)
                 return fsm
 
     pattern = r'(\w+)\s+(\w+)(?:\s*\{\s*([^}]+)\s*\})?\s*;'
@@ -250,17 +250,17 @@ def parse_casebody(casebody_str, array_names) -> FSM:
         field_name = match.group(2)  # Magic
         condition = match.group(3)  # Magic == 42
         # Attempt to find and parse the struct definition for this type
-        if data_type in FSM_map:
-            return copy.deepcopy(FSM_map[data_type])
+        if data_type in registry:
+            return registry.instantiate(data_type)
         else:
-            raise ValueError(f"cannot find {data_type} in FSM_map")
+            raise ValueError(f"cannot find {data_type} in the FSM registry")
             
     else:
         print(casebody_str)
         raise ValueError(f"unhandled situation: case body not match")
         return None
 
-def parse_casetype(casetype_str, array_names) -> FSM:
+def parse_casetype(casetype_str, array_names, registry) -> FSM:
     # Regex to capture the casetype name, type, and body
     casetype_pattern = re.compile(
     r"casetype\s+(\w+)\s*\(([\w\s,]+)\)\s*{\s*switch\s*\(\s*(\w+)\s*\)\s*{([\s\S]+?)}\s*}\s*(\w+);",
@@ -298,17 +298,17 @@ def parse_casetype(casetype_str, array_names) -> FSM:
     
     # Generate a list of casetype strings with one case each
     for case_number, case_body in cases:
-       casebody_FSM =  parse_casebody(case_body, array_names)
+       casebody_FSM =  parse_casebody(case_body, array_names, registry)
        fsm.entry.add_transition(f"{switch_param} == {case_number}", casebody_FSM)
        fsm.exits.append(casebody_FSM)
     print(len(cases))
     if len(cases)!=0:
         fsm.exits.remove(fsm.entry)
 
-    FSM_map[alias_name] =fsm
+    registry.register(alias_name, fsm)
     return fsm
 
-def parse_and_separate_types(input_text):
+def parse_and_separate_types(input_text, registry):
     i = 0
     length = len(input_text)
     array_names = set()
@@ -323,7 +323,7 @@ def parse_and_separate_types(input_text):
                     end += 1
                 print(input_text[start:end+1])
                 print("\n")               
-                print(parse_casetype(input_text[start:end+1], array_names))
+                print(parse_casetype(input_text[start:end+1], array_names, registry))
                 i = end + 1
     
         elif input_text.startswith("typedef struct", i):
@@ -336,7 +336,7 @@ def parse_and_separate_types(input_text):
                 print("matched struct:")
                 print(input_text[start:end+1])
                 print("\n")
-                print(parse_struct(input_text[start:end+1], array_names))
+                print(parse_struct(input_text[start:end+1], array_names, registry))
                 
                 i = end + 1
         elif input_text.startswith("entrypoint typedef struct", i):
@@ -349,7 +349,7 @@ def parse_and_separate_types(input_text):
                 print("matched struct:")
                 print(input_text[start:end+1])
                 print("\n")
-                print(parse_struct(input_text[start:end+1], array_names))
+                print(parse_struct(input_text[start:end+1], array_names, registry))
                 i = end + 1
         else:
             i += 1  # Move to the next character if no module start is found
@@ -371,24 +371,15 @@ def get_mutation_variables(pathstr, cur_diff):
     mutation_variables = set()
     cur_fsm = set()
   
-    for node_or_FSM in pathstr:           
-        if node_or_FSM:
-            FSMstart_pattern = re.compile(r'FSM_START\((\w+)\):\s*(.+)')
-            FSM_match = re.search(FSMstart_pattern, node_or_FSM)
-            if FSM_match:
-                if FSM_match.group(1) in cur_diff:
-                    cur_fsm.add(FSM_match.group(1))
-            
-            FSMend_pattern = re.compile(r'FSM_END\((\w+)\)')
-            FSM_match = re.search(FSMend_pattern, node_or_FSM)
-            if FSM_match and FSM_match.group(1) != 'None' and FSM_match.group(1) in cur_diff and FSM_match.group(1) in cur_fsm:
-                cur_fsm.remove(FSM_match.group(1))
+    for step in pathstr:
+        if isinstance(step, FsmEnter) and step.name in cur_diff:
+            cur_fsm.add(step.name)
+
+        if isinstance(step, FsmExit) and step.name in cur_diff and step.name in cur_fsm:
+            cur_fsm.remove(step.name)
 
-            if len(cur_fsm) > 0:
-                node_pattern = re.compile(r'Node\((\w+),\s*type=(\w+),\s*condition=(None|.+?)\s*\)')
-                node_match = re.search(node_pattern, node_or_FSM)
-                if node_match:
-                    mutation_variables.add(node_match.group(1))
+        if len(cur_fsm) > 0 and isinstance(step, FieldStep):
+            mutation_variables.add(step.name)
 
     return mutation_variables
 
@@ -398,7 +389,7 @@ def generate_test_cases(doc_file, saved_paths, entrystructname, command, protoco
 
     Incorrect_constraints = set()
     for pathstr in saved_paths:
-        print(" -> ".join(filter(None, pathstr)))
+        print(" -> ".join(map(str, pathstr)))
         z3_code = []
         variables ={} # z3 variables
         len_fsm = {}
@@ -408,80 +399,49 @@ def generate_test_cases(doc_file, saved_paths, entrystructname, command, protoco
 
         print("z3 encoding:")
         bit_number = 0
-        for node_or_FSM in pathstr:
-            if node_or_FSM:
-                node_pattern = re.compile(r'Node\((\w+),\s*type=(\w+),\s*condition=([^,]+)\s*\)')
-                node_match = re.search(node_pattern, node_or_FSM)
-                if node_match:              
-                    generate_z3_code_for_Node(node_match.group(1), node_match.group(2), node_match.group(3), z3_code, array_names, path_constraint, dependent_path_constraint)     
-                    if node_match.group(2) == "UINT8BE":
-                        variables[node_match.group(1)] = 1
-                        for fsm_name in len_fsm:
-                            len_fsm[fsm_name] += " + 1"
-                    elif node_match.group(2) == "UINT16BE":
-                        variables[node_match.group(1)] = 2
-                        for fsm_name in len_fsm:
-                            len_fsm[fsm_name] += " + 2"
-                    elif node_match.group(2) == "UINT32BE":
-                        variables[node_match.group(1)] = 4
-                        for fsm_name in len_fsm:
-                            len_fsm[fsm_name] += " + 4"
-                    elif node_match.group(2) == "UINT64BE":
-                        variables[node_match.group(1)] = 8
-                        for fsm_name in len_fsm:
-                            len_fsm[fsm_name] += " + 8"
-                    elif node_match.group(2).startswith("bit"):
-                        bit_size_str = node_match.group(2)[3:]
-                        bit_size = int(bit_size_str)  # Convert it to an integer
-                        bit_number += bit_size
-                        variables[node_match.group(1)] = node_match.group(2)
-                    elif node_match.group(2).isdigit():
-                        variables[node_match.group(1)] = int(int(node_match.group(2))/8)
-                        for fsm_name in len_fsm:
-                            len_fsm[fsm_name] += f" + {variables[node_match.group(1)]}"
-                    continue
-
-                # FSM_START(Message): BodyLength
-                FSMstart_pattern = re.compile(r'FSM_START\((\w+)\):\s*(.+)')
-                FSM_match = re.search(FSMstart_pattern, node_or_FSM)
-                if FSM_match:
-                    cur_FSM_seq.append(FSM_match.group(1))
+        for step in pathstr:
+            if isinstance(step, FieldStep):
+                generate_z3_code_for_Node(step.name, step.type, step.condition, z3_code, array_names, path_constraint, dependent_path_constraint)
+                if step.type.startswith("bit"):
+                    bit_number += step.width
+                    variables[step.name] = step.type
+                elif step.width is not None:
+                    # UINTnBE and widths in bits, counted in bytes
+                    variables[step.name] = int(step.width/8)
                     for fsm_name in len_fsm:
-                        print(bit_number)
-                        len_fsm[fsm_name] += " + " + str(bit_number / 8)
-                        bit_number = 0
-                    if FSM_match.group(2) != 'None':
-                        print(FSM_match.group(2))
-                        z3_code.append(f"Len_{FSM_match.group(1)} = Int('Len_{FSM_match.group(1)}')")
-                        z3_code.append(f's.assert_and_track(Len_{FSM_match.group(1)} == {FSM_match.group(2)}, "Len_{FSM_match.group(1)} == {FSM_match.group(2)}")')
-                        len_fsm[FSM_match.group(1)] = "0"
-                        continue
-                
-                # FSM_END(Payload)
-                FSMend_pattern = re.compile(r'FSM_END\((\w+)\)')
-                FSM_match = re.search(FSMend_pattern, node_or_FSM)
+                        len_fsm[fsm_name] += f" + {variables[step.name]}"
+
+            # FSM_START(Message): BodyLength
+            elif isinstance(step, FsmEnter):
+                cur_FSM_seq.append(step.name)
+                for fsm_name in len_fsm:
+                    print(bit_number)
+                    len_fsm[fsm_name] += " + " + str(bit_number / 8)
+                    bit_number = 0
+                if step.size_expr is not None:
+                    print(step.size_expr)
+                    z3_code.append(f"Len_{step.name} = Int('Len_{step.name}')")
+                    z3_code.append(f's.assert_and_track(Len_{step.name} == {step.size_expr}, "Len_{step.name} == {step.size_expr}")')
+                    len_fsm[step.name] = "0"
+
+            # FSM_END(Payload)
+            elif isinstance(step, FsmExit):
+                for fsm_name in len_fsm:
+                    len_fsm[fsm_name] += " + " + str(bit_number / 8)
+                    bit_number = 0
+                if step.name in len_fsm:
+                    z3_code.append(f's.assert_and_track(Len_{step.name} == {len_fsm[step.name]}, "Len_{step.name} == {len_fsm[step.name]}")')
+                    len_fsm.pop(step.name)
+
+            # [Type == 0] or [(IHL * 4 - 20) == 0]
+            elif isinstance(step, CondStep):
+                z3_expr, vars = toz3(step.condition)
+
+                if "z3_expr" != "True" and "z3_expr" != "False" and len(vars) >= 1:
+                    z3_expr_str = z3_expr.sexpr().replace('\n', ' ').strip()
+                    z3_expr_name = z3_expr_str.replace('\n', ' ').strip()
+                    z3_code.append(f's.assert_and_track({z3_expr}, "{z3_expr_name}")')
 
-                if FSM_match and FSM_match.group(1) != 'None':
-                    for fsm_name in len_fsm:
-                        len_fsm[fsm_name] += " + " + str(bit_number / 8)
-                        bit_number = 0
-                    if FSM_match.group(1) in len_fsm:
-                        z3_code.append(f's.assert_and_track(Len_{FSM_match.group(1)} == {len_fsm[FSM_match.group(1)]}, "Len_{FSM_match.group(1)} == {len_fsm[FSM_match.group(1)]}")')
-                        len_fsm.pop(FSM_match.group(1)) 
-                    continue
-                
-                # [Type == 0] or [(IHL * 4 - 20) == 0]
-                case_constraint_pattern = re.compile(r'\[(.+?)\]')
-                case_constraint_match = re.search(case_constraint_pattern, node_or_FSM)
-                if case_constraint_match:
-                    z3_expr, vars = toz3(case_constraint_match.group(1))
-                    
-                    if "z3_expr" != "True" and "z3_expr" != "False" and len(vars) >= 1:
-                        z3_expr_str = z3_expr.sexpr().replace('\n', ' ').strip()
-                        z3_expr_name = z3_expr_str.replace('\n', ' ').strip()
-                        z3_code.append(f's.assert_and_track({z3_expr}, "{z3_expr_name}")')
-                    continue    
-        
         print("path_constraint******")            
         print(path_constraint)
 
@@ -525,12 +485,14 @@ def extract_entrypoint_struct_names(format_code):
     return matches if matches else None
 
 def test_and_refine_format(doc_file, format, protocol, command):
-    array_names = parse_and_separate_types(format)
+    # A fresh registry per format, nothing is left over from formats tested before
+    registry = FSMRegistry()
+    array_names = parse_and_separate_types(format, registry)
     entrypoint_struct_names = extract_entrypoint_struct_names(format) 
 
     assert(len(entrypoint_struct_names) == 1)
-    fsm = FSM_map[entrypoint_struct_names[0]]
+    fsm = registry[entrypoint_struct_names[0]]
     print("\nAll possible paths in the FSM:\n")
-    # Perform DFS traversal and save all paths
-    saved_paths = fsm.save_all_paths()
+    # Paths are enumerated lazily, testing starts with the first one
+    saved_paths = select_paths(fsm, PATH_BUDGET, PATH_STRATEGY, PATH_SEED)
     return generate_test_cases(doc_file, saved_paths, entrypoint_struct_names[0], command, protocol, array_names)
@@ -1,17 +1,24 @@
 import os
-import time
 import autogen
 import sys
 sys.path.append(os.path.abspath('../../'))
 
 from utils import simple_parse, config_list
-def get_task_prompt(rfc):
+from llm_stats import track_agent_rounds
+from retry import run_with_retry, AGENT_RETRY_POLICY
+from prompt_builder import build_prompt_parts
+from llm_backend import agent_llm_config, register_agent_backend
+from artifact_store import collect_artifacts
+from diagram3d import compile_diagrams, identifier
+def get_task_prompt(rfc, skeleton=None):
     task_prompt = f"Your job is to translate specifications descibed in RFC documents to well defined and constrained 3D code. \n \
                     {rfc} \n  \
                     Make sure you constrain the code fields for each message type, especially for those constraints using 'must', 'must not', ....\n \
                     Execute code with the supplied function simple_parse only, do NOT use any other functions. Also, Please ***do DOT infer or interprete the 3D code directly***!!! If the code does not successfuly parse, you must fix it. Remember you are generating 3D code, not C code.\n \
                     Add comments to your code and explain your choices \n \
                     "
+    if skeleton:
+        task_prompt += f"The bit diagram of this section compiles to the following 3D, its field widths and offsets are exact. Start from it and add the constraints, variable-length fields and optional parts:\n{skeleton}\n"
     return task_prompt
 
 def get_developer_prompt(manual, example):
@@ -48,10 +55,10 @@ def get_developer_prompt(manual, example):
                             \n \n ###########  \n Call the provided function only, make sure you pass syntactically correct code to the funtion only, do not wrap your code. Listen to the feedback from the parsing function and fix any syntax mistakes you make. Explain why you chose to add an action when you do. You MUST retain all fields in the code to translate.\n  "
     return developer_prompt
 
-def agent_config(manual, example):
+def agent_config(manual, example, saved_chars=0):
     engineer = autogen.AssistantAgent(
         name="Developer",
-        llm_config={"config_list": config_list},
+        llm_config=agent_llm_config(config_list),
         is_termination_msg=lambda x: x.get("content", "") and "EverParse succeeded!" in x.get("content", "").rstrip(),
         max_consecutive_auto_reply = 30,
         system_message=get_developer_prompt(manual, example),
@@ -65,29 +72,38 @@ def agent_config(manual, example):
 
     engineer.register_for_llm(name="simple_parse", description="Parse the 3D code and return the result. If the code is syntactically correct, return 'EverParse succeeded!'. If there are syntax errors, return the error message.")(simple_parse)
     executor.register_for_execution(name="simple_parse")(simple_parse)
+    register_agent_backend(engineer)
+    track_agent_rounds("extract", engineer, executor, config_list[0].get("model"), saved_tokens=saved_chars // 4)
 
     return [engineer, executor]
 
-def agent_loop(manual, rfc, example):
-    agent_list = agent_config(manual, example)
+def agent_loop(manual, rfc, example, saved_chars=0, skeleton=None):
+    agent_list = agent_config(manual, example, saved_chars)
 
-    agent_list[1].initiate_chat(
-    agent_list[0],
-    message=get_task_prompt(rfc)
-    )
+    # The .3d files simple_parse verified during this conversation, the last one is the answer
+    with collect_artifacts() as produced:
+        agent_list[1].initiate_chat(
+        agent_list[0],
+        message=get_task_prompt(rfc, skeleton)
+        )
+    return produced[-1] if produced else None
+
+def verify_compiled_format(code, title):
+    with collect_artifacts() as produced:
+        simple_parse(code, identifier(title))
+    return produced[-1] if produced else None
 
 def extract_format(rfc):
-    request_success = False
-    with open("DSL/3d_syntax_check.txt", "r") as f:
-        manual = f.read()
-    with open("example/example.txt", "r") as f:
-        example = f.read()
-    while not request_success:
-        try:
-            agent_loop(manual, rfc, example)
-            request_success = True
-        except Exception as e:
-            print(f"Error: {e}")
-            print("Retrying......")
-            time.sleep(10)
-            continue
+    # A fixed layout drawn as a bit diagram is compiled directly, other diagrams give the agent a skeleton
+    title = rfc.split(":\n", 1)[0]
+    skeleton, simple = compile_diagrams(rfc, title)
+    if simple:
+        path = verify_compiled_format(skeleton, title)
+        if path:
+            print(f"Format of {title} compiled from its bit diagram.")
+            return path
+    # Only the manual rules and examples relevant to the constructs in this section are sent
+    manual, example, saved_chars = build_prompt_parts(rfc, "example/example.txt")
+    # Raises RetryError once the attempt budget is used up, callers record the failure and move on
+    path, _ = run_with_retry(lambda: agent_loop(manual, rfc, example, saved_chars, skeleton), AGENT_RETRY_POLICY, "extract_format")
+    return path
@@ -0,0 +1,134 @@
+import random
+from itertools import combinations
+from FSM import Node, FSMRef, PathCounter
+
+# Pairwise: random candidates drawn per selected path, and candidates in a row without a new pair before giving up
+PAIRWISE_CANDIDATES = 16
+PAIRWISE_PATIENCE = 4
+# Random: draws per requested path before giving up on finding unseen ones
+RANDOM_ATTEMPTS = 8
+
+
+def pick_weighted(rng, options):
+    # Weighted by the number of paths below each option: every path is equally likely
+    r = rng.randrange(sum(n for _, n in options))
+    for child, n in options:
+        if r < n:
+            return child
+        r -= n
+
+
+class ArmGain:
+    """Most arms not covered yet that a path from each point of the FSM can still take."""
+    def __init__(self, counter, covered):
+        self.counter = counter
+        self.covered = covered
+        self.gains = {}
+
+    def gain(self, fsm, current, flag):
+        key = (fsm, current, flag)
+        if key not in self.gains:
+            if current in fsm.exits:
+                flag = True
+            total = 0
+            if not isinstance(current, Node):
+                fragment = current.fsm if isinstance(current, FSMRef) else current
+                total = self.gain(fragment, fragment.entry, False)
+            options = self.counter.options(fsm, current, flag)
+            if options:
+                total += max(self.option_gain(fsm, current, flag, child, len(options) > 1) for child, _ in options)
+            self.gains[key] = total
+        return self.gains[key]
+
+    def option_gain(self, fsm, current, flag, child, fork):
+        new_arm = 1 if fork and (current, child) not in self.covered else 0
+        return new_arm + self.gain(fsm, child, flag)
+
+    def choose(self, rng):
+        def choose(fsm, branch, flag, options):
+            best = max(self.option_gain(fsm, branch, flag, child, True) for child, _ in options)
+            return pick_weighted(rng, [(child, n) for child, n in options if self.option_gain(fsm, branch, flag, child, True) == best])
+        return choose
+
+
+def arm_paths(counter, rng, budget, covered):
+    # Every path takes the most uncovered arms it can, until none is left or the budget is used up
+    while budget > 0:
+        gains = ArmGain(counter, covered)
+        if gains.gain(counter.root, counter.root.entry, False) == 0:
+            return
+        path, arms = counter.walk(gains.choose(rng))
+        covered.update(arms)
+        budget -= 1
+        yield path, arms
+
+
+def arm_pairs(arms):
+    return set(frozenset(pair) for pair in combinations(set(arms), 2) if pair[0][0] is not pair[1][0])
+
+
+def pairwise_paths(counter, rng, budget, covered, covered_pairs):
+    # Arms first, then the random path adding the most uncovered pairs of arms taken together
+    for path, arms in arm_paths(counter, rng, budget, covered):
+        covered_pairs.update(arm_pairs(arms))
+        budget -= 1
+        yield path, arms
+    misses = 0
+    while budget > 0 and misses < PAIRWISE_PATIENCE:
+        candidates = [counter.walk(lambda fsm, branch, flag, options: pick_weighted(rng, options)) for _ in range(PAIRWISE_CANDIDATES)]
+        path, arms = max(candidates, key=lambda candidate: len(arm_pairs(candidate[1]) - covered_pairs))
+        new_pairs = arm_pairs(arms) - covered_pairs
+        if not new_pairs:
+            misses += 1
+            continue
+        misses = 0
+        covered.update(arms)
+        covered_pairs.update(new_pairs)
+        budget -= 1
+        yield path, arms
+
+
+def random_paths(counter, rng, budget, covered):
+    seen = set()
+    for _ in range(budget * RANDOM_ATTEMPTS):
+        if len(seen) >= budget:
+            return
+        path, arms = counter.walk(lambda fsm, branch, flag, options: pick_weighted(rng, options))
+        if tuple(path) in seen:
+            continue
+        seen.add(tuple(path))
+        covered.update(arms)
+        yield path, arms
+
+
+def select_paths(fsm, budget, strategy="arms", seed=0):
+    """Yield the paths of fsm to test: all of them if there are at most budget, otherwise at most budget chosen by
+    strategy. 'arms' takes every arm of every fork (casetype cases, empty or not arrays) at least once,
+    'pairwise' also every pair of arms that can be taken together as far as the budget allows, 'random' samples
+    distinct paths uniformly with a fixed seed."""
+    counter = PathCounter(fsm)
+    total = counter.total()
+    print(f"The FSM has {total} paths, the budget is {budget}.")
+    if total <= budget:
+        yield from fsm.iter_paths()
+        return
+
+    rng = random.Random(seed)
+    covered = set()
+    covered_pairs = set()
+    if strategy == "arms":
+        selected = arm_paths(counter, rng, budget, covered)
+    elif strategy == "pairwise":
+        selected = pairwise_paths(counter, rng, budget, covered, covered_pairs)
+    elif strategy == "random":
+        selected = random_paths(counter, rng, budget, covered)
+    else:
+        raise ValueError(f"unknown path selection strategy {strategy}")
+    count = 0
+    for path, _ in selected:
+        count += 1
+        yield path
+    complete = ArmGain(counter, covered).gain(fsm, fsm.entry, False) == 0
+    print(f"Tested {count} of {total} paths ({strategy}, seed {seed}): {len(covered)} arms covered, "
+          + ("every arm covered" if complete else "some arms not covered")
+          + (f", {len(covered_pairs)} pairs of arms covered" if strategy == "pairwise" else "") + ".")
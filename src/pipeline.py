@@ -0,0 +1,78 @@
+import os
+import json
+import hashlib
+
+
+class Stage:
+    """One step of the pipeline. run(context) reads the files in inputs and writes the files in outputs,
+    its return value is kept in the state file and handed to later stages as context[name]."""
+
+    def __init__(self, name, inputs, outputs, run):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.run = run
+
+
+def fingerprint(paths, params):
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8"))
+    for path in paths:
+        digest.update(path.encode("utf-8"))
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """Stages in dependency order, with the completed ones recorded in state_file so that a run can resume."""
+
+    def __init__(self, stages, state_file):
+        self.stages = stages
+        self.state_file = state_file
+        produced = set()
+        self.external_inputs = []
+        for stage in stages:
+            for path in stage.inputs:
+                if path not in produced and path not in self.external_inputs:
+                    self.external_inputs.append(path)
+            produced.update(stage.outputs)
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, "r") as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        with open(self.state_file + ".tmp", "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(self.state_file + ".tmp", self.state_file)
+
+    def run(self, params, resume=False):
+        """Run every stage, or with resume only the first one not completed by an earlier run and the ones after it."""
+        context = dict(params)
+        inputs = fingerprint(self.external_inputs, params)
+        state = self.load_state() if resume else {}
+        if state and state.get("inputs") != inputs:
+            print("Pipeline inputs changed since the last run, starting over.")
+            state = {}
+        state["inputs"] = inputs
+        state.setdefault("done", {})
+
+        rerun = False
+        for i, stage in enumerate(self.stages):
+            if not rerun and stage.name in state["done"] and all(os.path.exists(path) for path in stage.outputs):
+                print(f"Stage {stage.name}: completed by an earlier run, skipped.")
+                context[stage.name] = state["done"][stage.name]
+                continue
+            rerun = True
+            # Whatever comes after a stage that runs again is stale
+            for later in self.stages[i:]:
+                state["done"].pop(later.name, None)
+            self.save_state(state)
+            print(f"Stage {stage.name}: running.")
+            context[stage.name] = stage.run(context)
+            state["done"][stage.name] = context[stage.name]
+            self.save_state(state)
+        return context
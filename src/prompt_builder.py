@@ -0,0 +1,128 @@
+import re
+from functools import lru_cache
+
+MANUAL_PATH = "DSL/3d_syntax_check.txt"
+
+# Manual chapters every prompt needs, and the ones only needed for a given construct
+CORE_CHAPTERS = ["Base Types", "Structs", "Constraints"]
+CONSTRUCT_CHAPTERS = {
+    "bitfield": ["Bitfields"],
+    "casetype": ["Tagged Unions", "Optional field"],
+    "parameterized": ["Parameterized Data Types", "Arrays"],
+    "array": ["Arrays"],
+    "define": ["Constants and Enumerations"],
+}
+
+# A row of an RFC bit diagram with a cell narrower than one byte, e.g. |Vers |  Diag   |Sta|P|F|
+NARROW_CELL_PATTERN = re.compile(r'^\s*\|.*?\|[^|\n]{1,14}\|', re.MULTILINE)
+
+
+def detect_constructs(text):
+    """Guess which 3D constructs a section (RFC text or 3D code) will need."""
+    constructs = set()
+    if "typedef struct" in text:
+        # 3D code: look at the constructs actually used
+        if re.search(r'\w+\s+\w+\s*:\s*\d+\s*[{;]', text):
+            constructs.add("bitfield")
+        if "casetype" in text:
+            constructs.add("casetype")
+        if re.search(r'typedef\s+struct\s+_\w+\s*\(', text):
+            constructs.add("parameterized")
+        if "[:byte-size" in text:
+            constructs.add("array")
+        if "#define" in text or "enum " in text:
+            constructs.add("define")
+        return constructs
+    # RFC text: look for the layouts that call for them
+    if NARROW_CELL_PATTERN.search(text) or re.search(r'\bflags?\b', text, re.IGNORECASE):
+        constructs.add("bitfield")
+    if re.search(r'\b(if present|optional|depends? on|dependent on|message types?)\b', text, re.IGNORECASE):
+        constructs.add("casetype")
+    if re.search(r'\b(variable|length of the)\b', text, re.IGNORECASE):
+        constructs.add("parameterized")
+    if "..." in text or re.search(r'\b(Length|Len|octets)\b', text):
+        constructs.add("array")
+    if re.search(r'\bValues are\b', text):
+        constructs.add("define")
+    return constructs
+
+
+@lru_cache(maxsize=None)
+def read_file(path):
+    with open(path, "r") as f:
+        return f.read()
+
+
+@lru_cache(maxsize=None)
+def manual_chapters(path=MANUAL_PATH):
+    # The manual is a preamble followed by '#### Title' chapters; keep them in file order
+    chapters = []
+    title = None
+    lines = []
+    for line in read_file(path).splitlines(keepends=True):
+        if line.startswith("#### "):
+            chapters.append((title, "".join(lines)))
+            title = line[5:].strip()
+            lines = []
+        lines.append(line)
+    chapters.append((title, "".join(lines)))
+    return tuple(chapters)
+
+
+@lru_cache(maxsize=None)
+def example_chunks(path):
+    # example.txt starts each example with 'Example N:', example_merge.txt with '***** Example N *****'
+    text = read_file(path)
+    starts = [m.start() for m in re.finditer(r'^(?:Example \d+:|\*+ Example \d+ \*+)', text, re.MULTILINE)]
+    if not starts:
+        return ((text, frozenset(detect_constructs(text))),)
+    chunks = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        chunk = text[start:end]
+        # Classify an example by its expected 3D output rather than by the RFC text it quotes
+        output = chunk.split("Expected output:", 1)[-1]
+        chunks.append((chunk, frozenset(detect_constructs(output))))
+    return tuple(chunks)
+
+
+def select_manual(constructs, path=MANUAL_PATH):
+    wanted = set(CORE_CHAPTERS)
+    for construct in constructs:
+        wanted.update(CONSTRUCT_CHAPTERS.get(construct, []))
+    # Chapters keep their manual order so that prompts for similar sections share the longest possible prefix
+    return "".join(text for title, text in manual_chapters(path) if title is None or title in wanted)
+
+
+def select_examples(constructs, path):
+    # Greedy cover: for each construct not shown yet, add the shortest example that uses it.
+    # Rarely used constructs go first, their examples usually show the common ones as well.
+    chunks = example_chunks(path)
+    selected = set()
+    covered = set()
+    for construct in sorted(constructs, key=lambda c: sum(c in needs for _, needs in chunks)):
+        if construct in covered:
+            continue
+        candidates = [i for i, (chunk, needs) in enumerate(chunks) if construct in needs]
+        if candidates:
+            best = min(candidates, key=lambda i: len(chunks[i][0]))
+            selected.add(best)
+            covered |= chunks[best][1]
+    if not selected:
+        selected.add(0)
+    return "".join(chunks[i][0] for i in sorted(selected))
+
+
+def build_prompt_parts(text, example_path, with_example=True):
+    """Return (manual, example, saved_chars) holding only the manual rules and examples relevant to text."""
+    constructs = detect_constructs(text)
+    manual = select_manual(constructs)
+    full_size = len(read_file(MANUAL_PATH))
+    if with_example:
+        example = select_examples(constructs, example_path)
+        full_size += len(read_file(example_path))
+    else:
+        example = read_file(example_path)
+    saved_chars = full_size - len(manual) - (len(example) if with_example else 0)
+    print(f"Prompt assembly for {sorted(constructs)}: saved {saved_chars} chars (~{saved_chars // 4} tokens) per call")
+    return manual, example, saved_chars
@@ -0,0 +1,100 @@
+import time
+import random
+
+from botocore.exceptions import BotoCoreError, ClientError, ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError
+
+# Bedrock error codes, see https://docs.aws.amazon.com/bedrock/latest/APIReference/API_runtime_InvokeModel.html
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException", "ServiceUnavailableException"}
+TIMEOUT_CODES = {"ModelTimeoutException", "ModelNotReadyException", "RequestTimeout", "RequestTimeoutException"}
+FATAL_CODES = {"ValidationException", "AccessDeniedException", "ResourceNotFoundException", "UnrecognizedClientException", "ExpiredTokenException"}
+
+
+class LLMError(Exception):
+    kind = "transient"
+
+
+class ThrottlingError(LLMError):
+    kind = "throttling"
+
+
+class LLMTimeoutError(LLMError):
+    kind = "timeout"
+
+
+class FatalLLMError(LLMError):
+    kind = "fatal"
+
+
+class RetryError(Exception):
+    """Raised when an operation failed with a fatal error or used up its attempt budget."""
+
+    def __init__(self, description, attempts, last_error):
+        self.attempts = attempts
+        self.last_error = last_error
+        super().__init__(f"{description} failed after {attempts} attempt(s): {last_error}")
+
+
+def bedrock_error(error):
+    # Turn a botocore exception raised by invoke_model into one of the LLMError classes
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        if code in THROTTLING_CODES:
+            return ThrottlingError(str(error))
+        if code in TIMEOUT_CODES:
+            return LLMTimeoutError(str(error))
+        if code in FATAL_CODES:
+            return FatalLLMError(str(error))
+        return LLMError(str(error))
+    if isinstance(error, (ReadTimeoutError, ConnectTimeoutError, EndpointConnectionError)):
+        return LLMTimeoutError(str(error))
+    return LLMError(str(error))
+
+
+def classify_error(error):
+    if isinstance(error, LLMError):
+        return error.kind
+    if isinstance(error, (BotoCoreError, ClientError)):
+        return bedrock_error(error).kind
+    # autogen wraps provider errors, so fall back on the message text
+    message = str(error)
+    if any(code in message for code in FATAL_CODES):
+        return "fatal"
+    if any(code in message for code in THROTTLING_CODES) or "rate limit" in message.lower():
+        return "throttling"
+    if any(code in message for code in TIMEOUT_CODES) or "timed out" in message.lower() or "timeout" in message.lower():
+        return "timeout"
+    return "transient"
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts, base_delay, max_delay, throttle_factor=2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttle_factor = throttle_factor
+
+    def delay(self, attempt, kind):
+        # Exponential backoff with full jitter; throttling backs off faster so we stop hammering the quota
+        delay = self.base_delay * (2 ** (attempt - 1))
+        if kind == "throttling":
+            delay *= self.throttle_factor
+        return random.uniform(0, min(delay, self.max_delay))
+
+
+LLM_RETRY_POLICY = RetryPolicy(max_attempts=4, base_delay=1, max_delay=30)
+AGENT_RETRY_POLICY = RetryPolicy(max_attempts=3, base_delay=10, max_delay=120)
+
+
+def run_with_retry(fn, policy, description="request"):
+    """Call fn until it returns, returning (result, retries). Raises RetryError on a fatal error or when out of attempts."""
+    for attempt in range(1, policy.max_attempts + 1):
+        try:
+            return fn(), attempt - 1
+        except Exception as e:
+            kind = classify_error(e)
+            print(f"Error ({kind}) in {description}: {e}")
+            if kind == "fatal" or attempt == policy.max_attempts:
+                raise RetryError(description, attempt, e) from e
+            delay = policy.delay(attempt, kind)
+            print(f"Retrying {description} in {delay:.1f}s ({attempt}/{policy.max_attempts})......")
+            time.sleep(delay)
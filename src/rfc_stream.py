@@ -0,0 +1,82 @@
+import re
+
+HEADER_PATTERN = re.compile(r'RFC (\d+)\s+(.*?)\s+([A-Za-z]+ \d{4})')
+FOOTER_PATTERN = re.compile(r'^.*\s+\[Page \d+\]$')
+SECTION_HEADER_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)(\.?)\s+(.*)$')
+# A section number alone on its line takes the next line as its title
+BARE_NUMBER_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)(\.?)\s*$')
+
+
+def clean_lines(lines):
+    """Drop page headers, footers and blank lines of an RFC, one line at a time."""
+    previous = None
+    for line in lines:
+        line = line.rstrip("\n")
+        line = HEADER_PATTERN.sub('', line)
+        line = FOOTER_PATTERN.sub('', line)
+        if not line.strip():
+            continue
+        if previous is None:
+            line = line.lstrip()
+        else:
+            yield previous
+        # One line of lookahead, the last line is right-stripped
+        previous = line
+    if previous is not None:
+        yield previous.rstrip()
+
+
+def iter_sections(lines):
+    """Yield (number, title, content) for every section of cleaned RFC lines, text before the first header is dropped."""
+    number = title = None
+    content = []
+    bare = None
+    for line in lines:
+        if bare is not None:
+            if number is not None:
+                yield number, title, "\n".join(content).strip()
+            number, title, content = bare, line.strip(), []
+            bare = None
+            continue
+        bare_match = BARE_NUMBER_PATTERN.match(line)
+        if bare_match:
+            # Only a header if a title follows, held back until the next line shows up
+            bare = bare_match.group(1)
+            bare_line = line
+            continue
+        match = SECTION_HEADER_PATTERN.match(line)
+        if match:
+            if number is not None:
+                yield number, title, "\n".join(content).strip()
+            number, title, content = match.group(1), match.group(3).strip(), []
+        elif number is not None:
+            content.append(line)
+    if bare is not None and number is not None:
+        content.append(bare_line)
+    if number is not None:
+        yield number, title, "\n".join(content).strip()
+
+
+def stream_rfc(readfile, writefile=None):
+    """Clean readfile line by line, optionally copying the cleaned text to writefile, and yield its sections."""
+    with open(readfile, 'r', encoding='utf-8') as source:
+        lines = clean_lines(source)
+        if writefile is None:
+            yield from iter_sections(lines)
+            return
+        with open(writefile, 'w', encoding='utf-8') as cleaned_file:
+            yield from iter_sections(tee_to_file(lines, cleaned_file))
+
+
+def tee_to_file(lines, file):
+    first = True
+    for line in lines:
+        file.write(line if first else "\n" + line)
+        first = False
+        yield line
+
+
+def read_sections(cleaned_file):
+    """Sections of a file stream_rfc already cleaned."""
+    with open(cleaned_file, 'r', encoding='utf-8') as f:
+        yield from iter_sections(line.rstrip("\n") for line in f)
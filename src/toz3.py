@@ -15,7 +15,7 @@ def identifymismatch(condition, doc):
 
     Output Format: "[myformat/parser] is incorrect because [Justification]."
     """
-    answer = askLLM(prompt)
+    answer = askLLM(prompt, stage="mismatch")
     match = re.search(r'\b(myformat|parser)\b is incorrect because', answer)
     if match:
         return match.group(1)  # Return the matched result (either 'myformat' or 'parser')
@@ -117,7 +117,7 @@ def generate_z3_code_for_Node(field_name, field_type, condition, z3_code, array_
     if field_name in array_names:
         return
     # Add condition if present
-    if condition!='None':
+    if condition:
         z3_expr, vars = toz3(condition)
         z3_expr_str = z3_expr.sexpr().replace('\n', ' ').strip()
         z3_expr_name = z3_expr_str.replace('\n', ' ').strip()
@@ -1,13 +1,22 @@
 import os
 import subprocess
 import shutil
-import random
 import json
+import time
 from botocore.config import Config
 
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from llm_cache import LLMCache, make_key
+from llm_stats import llm_stats, OTHER_STAGE
+from retry import bedrock_error, run_with_retry, LLM_RETRY_POLICY
+import llm_backend
+from verify_cache import VerificationCache, verification_key, toolchain_id, is_verdict
+from lint3d import lint_3d
+from artifact_store import ArtifactStore
 
 # Create a session to access credentials
 session = boto3.Session()
@@ -16,7 +25,57 @@ config_list = [ { ..., "temperature": 0.0} ] # todo: replace with actual config
 
 
 # Access the credentials
-current_credentials = credentials.get_frozen_credentials()
+current_credentials = credentials.get_frozen_credentials() if credentials else None # None on offline boxes (replay/scripted backends)
+
+# Need to request access to foundation models https://docs.aws.amazon.com/bedrock/latest/userguide/model-access.html
+MODEL_ID = "anthropic.claude-3-5-sonnet-20241022-v2:0"
+
+# Responses of askLLM are cached on disk, keyed by model id and request body
+LLM_CACHE_PATH = "cache/llm_cache.sqlite"
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Seconds to wait for another process (a batch job sharing the cache) to release the database
+LLM_CACHE_TIMEOUT = 30.0
+llm_cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_TIMEOUT)
+
+# Maximum number of askLLM calls in flight when summarizing the doc tree
+LLM_CONCURRENCY = 8
+
+# Short sections are summarized several per prompt, up to this many (estimated) input tokens.
+# The section count is also capped so that all answers fit in max_tokens of one response. 0 disables batching.
+SUMMARY_BATCH_TOKENS = 6000
+SUMMARY_BATCH_MAX_SECTIONS = 30
+
+# One long-lived Bedrock client per (region, pool size), shared by every thread of the process
+BEDROCK_REGION = "us-west-2"
+BEDROCK_MAX_POOL_CONNECTIONS = 32
+_bedrock_clients = {}
+_bedrock_clients_lock = threading.Lock()
+
+# All queries run on one background event loop instead of a fresh asyncio.run per prompt
+_llm_loop = None
+_llm_loop_lock = threading.Lock()
+
+# EverParse verifications run as subprocesses in per-job directories, EVERPARSE_JOBS at a time
+EVERPARSE_SCRIPT = "everparse/everparse.sh"
+EVERPARSE_FILES_DIR = "everparse/everparse_files"
+EVERPARSE_JOBS = os.cpu_count() or 4
+# Verified formats, one content-hashed directory per distinct 3D code
+artifact_store = ArtifactStore(EVERPARSE_FILES_DIR)
+
+# Verdicts of previous submissions, keyed by module name and normalized 3D source
+EVERPARSE_CACHE_PATH = "cache/everparse"
+everparse_cache = VerificationCache(EVERPARSE_CACHE_PATH)
+# Extraction and merge agents verify from many threads at once, this bounds the EverParse processes they start
+_everparse_slots = threading.BoundedSemaphore(EVERPARSE_JOBS)
+
+# Reject submissions breaking the developer prompt checklist before spending an EverParse run on them
+LINT_3D = True
+
+# Formats with more FSM paths than this are tested on a selection of them: "arms", "pairwise" or "random" (see path_sampling)
+PATH_BUDGET = 256
+PATH_STRATEGY = "arms"
+PATH_SEED = 0
+
 class BedrockClient:
     def __init__(self, region_name, config):
         self.client = boto3.client(
@@ -24,101 +83,161 @@ class BedrockClient:
         )
 
     def invoke_model(self, model_id, input_data, content_type="application/json"):
+        body, _ = self.invoke_model_with_metadata(model_id, input_data, content_type)
+        return body
+
+    def invoke_model_with_metadata(self, model_id, input_data, content_type="application/json"):
+        # Also returns the ResponseMetadata, which carries the number of retries botocore made
         try:
             response = self.client.invoke_model(
                 modelId=model_id, contentType=content_type, body=input_data
             )
-            return response["body"].read().decode("utf-8")
+            return response["body"].read().decode("utf-8"), response.get("ResponseMetadata", {})
         except (BotoCoreError, ClientError) as error:
             print("Error happened calling bedrock")
-            return {"error": str(error)}
+            raise bedrock_error(error) from error
 
 
+def build_request_body(prompt):
+    return {
+        "messages": prompt,
+        "max_tokens": 1600,
+        "anthropic_version": "bedrock-2023-05-31",
+        "temperature": 0,
+        "top_k": 50,
+    }
+
+def get_bedrock_client(region_name=BEDROCK_REGION, max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS):
+    key = (region_name, max_pool_connections)
+    with _bedrock_clients_lock:
+        if key not in _bedrock_clients:
+            # Keep-alive connections are reused across calls, so TLS setup is paid once per pooled connection
+            config = Config(read_timeout=20, max_pool_connections=max_pool_connections, tcp_keepalive=True)
+            _bedrock_clients[key] = BedrockClient(region_name, config)
+        return _bedrock_clients[key]
+
+def get_llm_loop():
+    global _llm_loop
+    with _llm_loop_lock:
+        if _llm_loop is None:
+            _llm_loop = asyncio.new_event_loop()
+            # boto3 is blocking, size the executor like the connection pool so no call waits on a socket
+            _llm_loop.set_default_executor(ThreadPoolExecutor(max_workers=BEDROCK_MAX_POOL_CONNECTIONS))
+            threading.Thread(target=_llm_loop.run_forever, name="llm-loop", daemon=True).start()
+        return _llm_loop
+
 async def query(prompt):
-    config = Config(read_timeout=20)
-    # Need to request access to foundation models https://docs.aws.amazon.com/bedrock/latest/userguide/model-access.html
-    model_id = "anthropic.claude-3-5-sonnet-20241022-v2:0"
-    br_client = BedrockClient("us-west-2", config)
-    body = json.dumps(
-        {
-            "messages": prompt,
-            "max_tokens": 1600,
-            "anthropic_version": "bedrock-2023-05-31",
-            "temperature": 0,
-            "top_k": 50,
-        }
-    )
-    
-    br_response = br_client.invoke_model(model_id=model_id, input_data=body)
+    br_client = get_bedrock_client()
+    body = json.dumps(build_request_body(prompt))
+
+    loop = asyncio.get_running_loop()
+    br_response, metadata = await loop.run_in_executor(None, br_client.invoke_model_with_metadata, MODEL_ID, body)
     response = json.loads(br_response)  # Parse if it's a string
-    return response["content"][0]["text"]
+    return response["content"][0]["text"], response.get("usage", {}), metadata.get("RetryAttempts", 0)
 
-def askLLM(prompt):
+def askLLM(prompt, stage=OTHER_STAGE, use_cache=True):
+    # stage tags the call in llm_stats: summary, hierarchy or mismatch
     test_prompt = [
         {"role": "user", "content": prompt},
     ]
-    response = asyncio.run(query(test_prompt))
+    start = time.time()
+    key = make_key(MODEL_ID, build_request_body(test_prompt))
+    # Recordings and canned answers are the source of truth for the offline backends, bypass the cache
+    use_cache = use_cache and llm_backend.LLM_MODE == "live"
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            llm_stats.record(stage, MODEL_ID, time.time() - start, 0, 0, cached=True)
+            return cached
+
+    def live_call():
+        (response, usage, retries), our_retries = run_with_retry(
+            lambda: asyncio.run_coroutine_threadsafe(query(test_prompt), get_llm_loop()).result(),
+            LLM_RETRY_POLICY, f"askLLM ({stage})"
+        )
+        return response, usage, retries + our_retries
+
+    response, usage, retries = llm_backend.complete(test_prompt, live_call)
+    llm_stats.record(stage, MODEL_ID, time.time() - start, usage.get("input_tokens", 0), usage.get("output_tokens", 0), retries)
+    if use_cache:
+        llm_cache.put(key, MODEL_ID, response)
     return response
 
-def simple_parse(code:str, module_name:str):
-    module_name = module_name.upper()
-    base_path = "everparse/everparse_files"
-    while True:
-        dir_path = os.path.join(base_path, module_name)
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)  # Create the full directory path
-            print(f"Directory {dir_path} created.")
-            break
-        else:
-            print(f"Directory {dir_path} already exists.")
-            module_name = module_name + str(random.randint(0, 10))  # Append a random number to avoid conflicts
-            
-    filename = f"{module_name}.3d"
-    filepath = os.path.join(dir_path, filename)
-    with open(filepath, "w") as f:
-        f.write(code)
-        print(f"Finish writing 3d code under {filepath}")
-    print(dir_path)
-    print(os.getcwd())
-    os.chdir(dir_path)
-    print(os.getcwd())
-    call = f"bash ../../everparse.sh --no_clang_format {filename}"
+def run_everparse(work_dir, filename):
+    # Runs with cwd= instead of os.chdir, so any number of verifications can run side by side
+    call = ["bash", os.path.abspath(EVERPARSE_SCRIPT), "--no_clang_format", filename]
     print("Calling everparse.....")
-    print(call)
-    process = subprocess.Popen(
-        call, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-    )
-    stdout, stderr = process.communicate()
-    if stdout:
-        output_dump = stdout.decode("utf-8")
-    else:
-        output_dump = ""
-    if stderr:
-        output_err = stderr.decode("utf-8")
-    else:
-        output_err = ""
+    print(" ".join(call))
+    with _everparse_slots:
+        process = subprocess.run(call, cwd=work_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output_dump = process.stdout.decode("utf-8", errors="replace") if process.stdout else ""
+    output_err = process.stderr.decode("utf-8", errors="replace") if process.stderr else ""
     print("EverParse output:")
     print(output_dump)
     print("EverParse error:")
     print(output_err)
-    os.chdir("../../..")  # Change back to the grandparent directory
-
-    if "EverParse succeeded" not in output_dump:  
-        print("Everparse unsuccess")
-        if  "Cannot verify u" in output_err and "subtraction" in output_err:
-            output_dump = "\nThe old format has Uint substraction, e.g., use x-y without guarantee x>=y before use of x-y"
-        elif "Cannot verify u" in output_err and "addition" in output_err:
-            output_dump = "\nThe old format has Uint addition, e.g., use x + y wihout guarantee x + y < type bound, e.g., UINT8BE Plen, should have Plen <= 255 - 7 before use (Plen + 7)"
-        elif "unknown language unknown" in output_err:
-            output_dump = "\nPlease regenerate and Execute code with the supplied function simple_parse only!"
-        elif "Error 168" in output_dump:
-            output_dump = "Syntax error, type is a reserved keyword"
-        # else:         
-        #     output_dump = "ERROR, try again and Execute code with the supplied function simple_parse only: " + output_dump 
-            # output_dump += "\nPlease regenerate!DO NOT use 'type' as an identifier! Do NOT use 'struct.field' , consider expand the struct fields with the current struct! casetype syntax should be as follows: casetype _NAME (Type variable_name) {{ switch(variable_name){{ ...}} }} NAME; Type variable_name should not be defined inside the casetype, e.g., {{..Type variable_name; _NAME(variable_name);...}}, Do not add default type in casetype!!"
-        shutil.rmtree(dir_path)
-
-    else:
-        output_dump +="\nEverParse succeeded!\n"
+    return output_dump, output_err, process.returncode
+
+def distill_everparse_error(output_dump, output_err):
+    if  "Cannot verify u" in output_err and "subtraction" in output_err:
+        output_dump = "\nThe old format has Uint substraction, e.g., use x-y without guarantee x>=y before use of x-y"
+    elif "Cannot verify u" in output_err and "addition" in output_err:
+        output_dump = "\nThe old format has Uint addition, e.g., use x + y wihout guarantee x + y < type bound, e.g., UINT8BE Plen, should have Plen <= 255 - 7 before use (Plen + 7)"
+    elif "unknown language unknown" in output_err:
+        output_dump = "\nPlease regenerate and Execute code with the supplied function simple_parse only!"
+    elif "Error 168" in output_dump:
+        output_dump = "Syntax error, type is a reserved keyword"
+    # else:         
+    #     output_dump = "ERROR, try again and Execute code with the supplied function simple_parse only: " + output_dump 
+        # output_dump += "\nPlease regenerate!DO NOT use 'type' as an identifier! Do NOT use 'struct.field' , consider expand the struct fields with the current struct! casetype syntax should be as follows: casetype _NAME (Type variable_name) {{ switch(variable_name){{ ...}} }} NAME; Type variable_name should not be defined inside the casetype, e.g., {{..Type variable_name; _NAME(variable_name);...}}, Do not add default type in casetype!!"
+    return output_dump
+
+def simple_parse(code:str, module_name:str):
+    module_name = module_name.upper()
+    if LINT_3D:
+        problems = lint_3d(code)
+        if problems:
+            print("Everparse unsuccess (rejected by 3D lint)")
+            return "", "\nPlease regenerate! " + " ".join(problems)
+    # Without a script there is no EverParse to vouch for a cached verdict, nor to produce a new one worth keeping
+    toolchain = toolchain_id(EVERPARSE_SCRIPT)
+    key = verification_key(code, module_name, toolchain) if toolchain else None
+    filename = f"{module_name}.3d"
+    cached = everparse_cache.get(key) if key else None
+    if cached:
+        print(f"EverParse verdict for {module_name} found in cache.")
+        if cached["succeeded"]:
+            staging = artifact_store.staging_dir(module_name)
+            everparse_cache.restore_artifacts(key, cached["module_name"], module_name, staging)
+            with open(os.path.join(staging, filename), "w") as f:
+                f.write(code)
+            artifact_store.publish(module_name, code, staging)
+        return cached["output_err"], cached["output_dump"]
+
+    # EverParse runs in a private staging directory, only successful runs are published to the artifact store
+    work_dir = artifact_store.staging_dir(module_name)
+    try:
+        with open(os.path.join(work_dir, filename), "w") as f:
+            f.write(code)
+            print(f"Finish writing 3d code under {work_dir}")
+        output_dump, output_err, returncode = run_everparse(work_dir, filename)
+        succeeded = "EverParse succeeded" in output_dump
+        cacheable = key is not None and is_verdict(succeeded, output_dump, output_err, returncode)
+
+        if not succeeded:
+            print("Everparse unsuccess")
+            if not cacheable:
+                print(f"EverParse gave no verdict on the code (exit code {returncode}), the failure is not cached.")
+            output_dump = distill_everparse_error(output_dump, output_err)
+            if cacheable:
+                everparse_cache.put(key, module_name, False, output_err, output_dump)
+        else:
+            output_dump +="\nEverParse succeeded!\n"
+            if cacheable:
+                everparse_cache.put(key, module_name, True, output_err, output_dump, work_dir)
+            path = artifact_store.publish(module_name, code, work_dir)
+            print(f"Finish writing 3d code under {path}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
     
     return output_err, output_dump
@@ -0,0 +1,97 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+
+def normalize_3d(code):
+    # Comments and formatting do not change what EverParse verifies
+    code = re.sub(r'/\*.*?\*/', ' ', code, flags=re.DOTALL)
+    code = re.sub(r'//[^\n]*', ' ', code)
+    code = re.sub(r'\s+', ' ', code)
+    code = re.sub(r'\s*([{}()\[\];,:=<>!&|+\-*/])\s*', r'\1', code)
+    return code.strip()
+
+
+# An error EverParse reports against the 3D code: 'FOO.3d:(3,10): (Error) ..', '(Error 168) ..', F* bound checks
+VERDICT_ERROR_PATTERN = re.compile(r'\.3d:\(\d+,\d+\)|\(Error(?: \d+)?\)|Error \d+|Cannot verify u')
+# Failures that say nothing about the code: solver limits, killed or crashed toolchains
+TRANSIENT_ERROR_PATTERN = re.compile(r'rlimit|canceled|timeout|timed out|Killed|out of memory|Stack overflow|No such file', re.IGNORECASE)
+
+
+def toolchain_id(script_path):
+    """Identifies the EverParse install a verdict comes from by a hash of its script, None if there is no script."""
+    try:
+        with open(script_path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+def is_verdict(succeeded, output_dump, output_err, returncode):
+    # Only what EverParse decided about the code is worth caching, never a failure of the environment
+    if succeeded:
+        return returncode == 0
+    output = output_dump + "\n" + output_err
+    if returncode <= 0 or returncode in (126, 127) or TRANSIENT_ERROR_PATTERN.search(output):
+        return False
+    return bool(VERDICT_ERROR_PATTERN.search(output))
+
+
+def verification_key(code, module_name, toolchain):
+    # The module name is part of the key: it names the generated artifacts and shows up in error messages.
+    # So is the toolchain, a verdict of another EverParse version does not hold.
+    return hashlib.sha256((toolchain + "\n" + module_name + "\n" + normalize_3d(code)).encode("utf-8")).hexdigest()
+
+
+class VerificationCache:
+    """Directory cache of EverParse verdicts: <key>/result.json plus the artifacts of successful runs."""
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        result_file = os.path.join(self.path, key, "result.json")
+        if not os.path.exists(result_file):
+            with self.lock:
+                self.misses += 1
+            return None
+        with open(result_file, "r") as f:
+            result = json.load(f)
+        with self.lock:
+            self.hits += 1
+        return result
+
+    def put(self, key, module_name, succeeded, output_err, output_dump, artifact_dir=None):
+        os.makedirs(self.path, exist_ok=True)
+        # Build the entry next to its final place and rename it in, readers never see half an entry
+        staging = tempfile.mkdtemp(prefix=".staging_", dir=self.path)
+        if artifact_dir:
+            shutil.copytree(artifact_dir, os.path.join(staging, "artifacts"))
+        with open(os.path.join(staging, "result.json"), "w") as f:
+            json.dump({"module_name": module_name, "succeeded": succeeded, "output_err": output_err, "output_dump": output_dump}, f, indent=4)
+        try:
+            os.rename(staging, os.path.join(self.path, key))
+        except OSError:
+            # Another job stored the same verdict first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def restore_artifacts(self, key, cached_module, module_name, dir_path):
+        # Artifacts are named after the module they were verified under, rename them for the new directory
+        artifact_dir = os.path.join(self.path, key, "artifacts")
+        if not os.path.isdir(artifact_dir):
+            return
+        for name in os.listdir(artifact_dir):
+            target = module_name + name[len(cached_module):] if name.startswith(cached_module) else name
+            shutil.copy2(os.path.join(artifact_dir, name), os.path.join(dir_path, target))
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        print(f"EverParse cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)")
@@ -0,0 +1,44 @@
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules under src/ import each other by their bare names
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+def unconfigured(*args, **kwargs):
+    raise RuntimeError("utils could not be imported, fill in config_list in src/utils.py to call the LLM or EverParse")
+
+
+def stub_utils():
+    """Stand-in for utils when it cannot be imported, e.g. while config_list is still the placeholder.
+    Enough to import the FSM and parser modules, whose tests never call the LLM or EverParse."""
+    utils = types.ModuleType("utils")
+    utils.config_list = []
+    utils.askLLM = utils.simple_parse = unconfigured
+    utils.artifact_store = None
+    utils.LLM_CONCURRENCY = 8
+    utils.SUMMARY_BATCH_TOKENS = 6000
+    utils.SUMMARY_BATCH_MAX_SECTIONS = 30
+    utils.PATH_BUDGET, utils.PATH_STRATEGY, utils.PATH_SEED = 256, "arms", 0
+    return utils
+
+
+try:
+    import utils
+except SyntaxError:
+    sys.modules["utils"] = stub_utils()
+
+
+def repo_path(*parts):
+    return os.path.join(ROOT, *parts)
+
+
+def example(number):
+    """Example <number> of example/example.txt: (description, expected 3D code)."""
+    with open(repo_path("example", "example.txt"), "r") as f:
+        text = f.read()
+    block = text.split(f"Example {number}:")[1].split(f"Example {number + 1}:")[0]
+    description, _, code = block.partition("#### Expected output:")
+    return description, code.split("!!!note!")[0]
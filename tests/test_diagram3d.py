@@ -0,0 +1,68 @@
+from conftest import example, repo_path
+from diagram3d import compile_diagrams, find_diagrams, parse_diagram
+from rfc_stream import stream_rfc
+
+
+def bfd_section(number):
+    return next(section for section in stream_rfc(repo_path("RFC", "BFD.txt")) if section[0] == number)
+
+
+def test_fixed_diagram():
+    description, _ = example(3)
+    code, simple = compile_diagrams(description.split("The Flags field")[0], "Hello")
+    assert simple
+    assert code == ("entrypoint typedef struct _Hello {\n"
+                    "  UINT8BE Type { Type == 4 };\n"
+                    "  UINT8BE Length;\n"
+                    "  UINT16BE Flags;\n"
+                    "  UINT16BE Seqno;\n"
+                    "  UINT16BE Interval;\n"
+                    "} Hello;\n")
+
+
+def test_bitfields_and_tall_fields():
+    _, title, content = bfd_section("4.1")
+    fields = parse_diagram(find_diagrams(content)[0])
+    assert [(text, width) for text, _, width in fields[:3]] == [("Vers", 3), ("Diag", 5), ("Sta", 2)]
+    assert ("My Discriminator", 32, 32) in fields
+    code, simple = compile_diagrams(content, title)
+    assert "  UINT8BE Vers : 3;\n  UINT8BE Diag : 5;\n" in code
+    assert "  UINT32BE RequiredMinEchoRXInterval;\n" in code
+
+
+def test_open_row_is_variable_length():
+    # The Prefix row is left open and closed by a partial border
+    description, _ = example(1)
+    code, simple = compile_diagrams(description, "Route Request")
+    assert not simple
+    assert "  UINT8BE Plen;\n  // Prefix: variable length" in code
+
+
+def test_open_row_after_fixed_cells():
+    # '|     Type      |    Length     |     Body...' must not drop the generic TLV diagram
+    description, _ = example(2)
+    diagrams = find_diagrams(description)
+    assert len(diagrams) == 3
+    fields = parse_diagram(diagrams[0])
+    assert fields == [("Type", 0, 8), ("Length", 8, 8), ("Body", 16, None)]
+    code, simple = compile_diagrams(description, "Sub-TLV Format")
+    assert not simple
+    assert "// Body: variable length" in code
+
+
+def test_variable_auth_data():
+    _, title, content = bfd_section("4.2")
+    code, simple = compile_diagrams(content, title)
+    assert not simple
+    assert "  UINT8BE AuthKeyID;\n  // Password: variable length" in code
+
+
+def test_stray_diagram_lines_make_section_not_simple():
+    description, _ = example(3)
+    text = description.split("The Flags field")[0] + "\nMore text\n|   Unparsed trailing row\n"
+    _, simple = compile_diagrams(text, "Hello")
+    assert not simple
+
+
+def test_no_diagram():
+    assert compile_diagrams("Just prose, no diagram.", "Prose") == (None, False)
@@ -0,0 +1,30 @@
+import pytest
+from conftest import example
+from lint3d import LINT_RULES, lint_3d
+
+
+@pytest.mark.parametrize("number", [1, 2, 3])
+def test_expected_outputs_are_clean(number):
+    _, code = example(number)
+    assert lint_3d(code) == []
+
+
+@pytest.mark.parametrize("code, rule", [
+    ("typedef struct _A { UINT8BE type; } A;", 0),
+    ("typedef struct _A { UINT8BE Body[0]; } A;", 1),
+    ("typedef struct _A { UINT8BE Body[]; } A;", 1),
+    ("typedef struct _A { UINT8BE Flag { Flag == 1 ? 1 : 0 }; } A;", 2),
+    ("typedef struct _A { UINT8BE Data[:]; } A;", 3),
+    ("typedef struct _A { UINT8BE Length; UINT8BE Data[:byte-size Header.Length]; } A;", 4),
+    ("casetype _B (UINT8 Kind) { switch (Kind) { case 1: UINT8BE One; default: UINT8BE Other; } } B;", 5),
+    ("typedef struct{ UINT8BE Kind; } A;", 6),
+    ("casetype _B (UINT8 Kind) { switch (Kind) { case 1: struct{ UINT8BE One; }; } } B;", 7),
+])
+def test_checklist_violations(code, rule):
+    assert lint_3d(code) == [LINT_RULES[rule][1]]
+
+
+def test_comments_are_ignored():
+    code = ("// the type field below is at most Header.Length long\n"
+            "typedef struct _A {\n  UINT8BE Kind; /* type? */\n  UINT8BE Data[:byte-size 4];\n} A;\n")
+    assert lint_3d(code) == []
@@ -0,0 +1,80 @@
+import random
+import re
+import pytest
+from conftest import example
+
+# The FSM is built on z3 and the parser modules come with the agents
+pytest.importorskip("z3")
+pytest.importorskip("autogen")
+from FSM import CondStep, FSMRegistry, PathCounter
+from parseformat import parse_and_separate_types
+from path_sampling import pick_weighted, select_paths
+
+
+def build(code):
+    registry = FSMRegistry()
+    parse_and_separate_types(code, registry)
+    return registry[re.search(r'entrypoint typedef struct _(\w+)', code).group(1)]
+
+
+def casetypes(n):
+    # n casetypes of 3 cases each in a row, 3**n paths
+    parts = ["typedef struct _Leaf {\n  UINT8BE A;\n} Leaf;\n"]
+    for i in range(n):
+        parts.append(f"casetype _C{i} (UINT8 K{i}) {{\n  switch (K{i}) {{\n    case 1: Leaf X{i};\n"
+                     f"    case 2: struct {{ UINT16BE P{i}; }} Q{i};\n    case 3: unit E{i};\n  }}\n}} C{i};\n")
+    body = "\n".join(f"  UINT8BE K{i};\n  C{i}(K{i}) c{i};" for i in range(n))
+    parts.append(f"entrypoint typedef struct _Big {{\n{body}\n}} Big;\n")
+    return "\n".join(parts)
+
+
+def conditions(path):
+    return set(step.condition for step in path if isinstance(step, CondStep))
+
+
+@pytest.mark.parametrize("number", [1, 2, 3])
+def test_count_matches_enumeration(number):
+    _, code = example(number)
+    fsm = build(code)
+    assert PathCounter(fsm).total() == len(fsm.save_all_paths())
+
+
+def test_count_and_walks_on_casetypes():
+    fsm = build(casetypes(3))
+    paths = set(tuple(path) for path in fsm.iter_paths())
+    counter = PathCounter(fsm)
+    assert counter.total() == len(paths) == 27
+    rng = random.Random(0)
+    walks = [counter.walk(lambda fsm, branch, flag, options: pick_weighted(rng, options))[0] for _ in range(200)]
+    assert all(tuple(path) in paths for path in walks)
+
+
+def test_small_format_is_enumerated():
+    fsm = build(casetypes(2))
+    assert list(select_paths(fsm, 9)) == fsm.save_all_paths()
+
+
+@pytest.mark.parametrize("strategy", ["arms", "pairwise", "random"])
+def test_strategies_stay_within_budget(strategy):
+    fsm = build(casetypes(6))
+    paths = set(tuple(path) for path in fsm.iter_paths())
+    selected = [tuple(path) for path in select_paths(fsm, 20, strategy)]
+    assert 0 < len(selected) <= 20
+    assert len(set(selected)) == len(selected)
+    assert all(path in paths for path in selected)
+
+
+def test_arms_cover_every_case():
+    fsm = build(casetypes(6))
+    selected = list(select_paths(fsm, 5, "arms"))
+    # 3 cases per casetype need 3 paths
+    assert len(selected) == 3
+    covered = set().union(*(conditions(path) for path in selected))
+    assert all(f"K{i} == {case}" in covered for i in range(6) for case in (1, 2, 3))
+
+
+@pytest.mark.parametrize("strategy", ["arms", "pairwise", "random"])
+def test_seeded_selection_is_deterministic(strategy):
+    fsm = build(casetypes(6))
+    first = list(select_paths(fsm, 20, strategy, seed=7))
+    assert list(select_paths(fsm, 20, strategy, seed=7)) == first
@@ -0,0 +1,50 @@
+import re
+from conftest import repo_path
+from rfc_stream import read_sections, stream_rfc
+
+PAGE_BREAK = """
+Katz & Ward                  Standards Track                    [Page 9]
+
+RFC 5880                 Bidirectional Forwarding Detection        June 2010
+
+"""
+
+
+def legacy_sections(text):
+    # clean_text and handle_doc of main.py before the RFC was streamed, on the whole text at once
+    text = re.sub(r'RFC (\d+)\s+(.*?)\s+([A-Za-z]+ \d{4})', '', text)
+    text = re.sub(r'^.*\s+\[Page \d+\]$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n\s*\n', '\n', text).strip()
+    headers = list(re.finditer(r'^(\d+(?:\.\d+)*)(\.?)\s+(.*)$', text, re.MULTILINE))
+    sections = []
+    for i, match in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        sections.append((match.group(1), match.group(3).strip(), text[match.end():end].strip()))
+    return text, sections
+
+
+def test_bfd_matches_legacy(tmp_path):
+    with open(repo_path("RFC", "BFD.txt"), "r", encoding="utf-8") as f:
+        text, expected = legacy_sections(f.read())
+    cleaned = tmp_path / "cleaned.txt"
+    sections = list(stream_rfc(repo_path("RFC", "BFD.txt"), str(cleaned)))
+    assert sections == expected
+    assert [number for number, _, _ in sections] == ["4", "4.1", "4.2", "4.3", "4.4"]
+    assert cleaned.read_text(encoding="utf-8") == text
+    with open(repo_path("RFC", "cleaned_BFD.txt"), "r", encoding="utf-8") as f:
+        assert f.read() == text
+    assert list(read_sections(str(cleaned))) == expected
+
+
+def test_page_breaks_and_bare_numbers_match_legacy(tmp_path):
+    with open(repo_path("RFC", "BFD.txt"), "r", encoding="utf-8") as f:
+        body = f.read()
+    # A page break inside a section, a number alone on its line with the title below, a number at the very end
+    text = ("Preamble dropped\n\n" + body.replace("\n4.2.", PAGE_BREAK + "4.2.", 1)
+            + "\n5\nBare Title\n   Content of five.\n\n6.1\n")
+    source = tmp_path / "rfc.txt"
+    source.write_text(text, encoding="utf-8")
+    _, expected = legacy_sections(text)
+    sections = list(stream_rfc(str(source)))
+    assert sections == expected
+    assert sections[-1] == ("5", "Bare Title", "Content of five.\n6.1")